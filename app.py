@@ -1,11 +1,132 @@
 import pandas as pd
 import streamlit as st
 from datetime import datetime
-from functions import CleaningUtils, AnalysisUtils, im
-import plotly.express as px
+from functions import CleaningUtils, AttendanceMatrix, AttendanceRules, AnalysisUtils, ExportUtils, PipelineProfiler, PipelineJobRunner, FilterIndex, QueryEngine, TableUtils
+import hashlib
+import os
 import io
+import time
+from PIL import Image
 
 
+# Bounds for every cached pipeline stage, so the server memory does not grow without limit across sessions
+CACHE_MAX_ENTRIES = 4
+CACHE_TTL_SECONDS = 60 * 60
+
+
+def file_content_hash(uploaded_file):
+    # Key the cached stages on the uploaded bytes rather than on the upload widget
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+
+# Pipeline runs happen in background threads shared by every session, so the page stays
+# responsive and concurrent uploads do not queue behind each other's script runs
+PIPELINE_WORKERS = 2
+PIPELINE_STAGE_COUNT = 7
+JOB_POLL_SECONDS = 0.5
+
+# Results of identical uploads are shared by every session; beyond this budget the least
+# recently used ones are spilled to disk, so memory grows with datasets rather than users
+RESULT_MEMORY_BUDGET_MB = 512
+MAX_SHARED_RESULTS = CACHE_MAX_ENTRIES * 4
+
+# Rows shown for an ad-hoc SQL query
+QUERY_MAX_ROWS = 10000
+
+
+# Attendance codes and late/overtime policies; read once when the app starts, built-in rules if the file is missing
+ATTENDANCE_RULES_PATH = 'attendance_rules.json'
+
+
+@st.cache_resource
+def load_attendance_rules():
+    return AttendanceRules.load(ATTENDANCE_RULES_PATH) if os.path.exists(ATTENDANCE_RULES_PATH) else AttendanceRules()
+
+
+@st.cache_resource
+def get_job_runner():
+    return PipelineJobRunner(workers=PIPELINE_WORKERS, max_finished_jobs=MAX_SHARED_RESULTS, ttl_seconds=CACHE_TTL_SECONDS,
+                             memory_budget_bytes=RESULT_MEMORY_BUDGET_MB * 1024 ** 2)
+
+
+def run_attendance_pipeline(job, attendance_bytes, master_list_bytes, schedule_bytes, rules):
+    # Runs in a background thread; every stage reports its progress to the job and stops it if it was cancelled
+    master_list_df = job.run_stage('create_master_employee_list', CleaningUtils.create_master_employee_list, io.BytesIO(master_list_bytes))
+    # Sheets are parsed serially: worker processes forked from this background thread could inherit locks held by other threads
+    sched_df = job.run_stage('create_schedule_dataframe', CleaningUtils.create_schedule_dataframe, io.BytesIO(schedule_bytes), workers=1, profiler=job.profiler)
+    attendance_df, date_list = job.run_stage('generate_attendance_dataframe', CleaningUtils.generate_attendance_dataframe, io.BytesIO(attendance_bytes))
+
+    merged_df = job.run_stage('incorporate_master_data', CleaningUtils.incorporate_master_data, attendance_df, master_list_df, date_list)
+
+    # The attendance is coded as a typed matrix; only its employee details, rendered records and
+    # code flags are kept, so the analytics never parse the remarks
+    attendance_matrix, unparsed_times_df = job.run_stage('encode_attendance_matrix', CleaningUtils.encode_attendance_matrix, merged_df, sched_df, rules)
+    grouped_df = job.run_stage('AttendanceMatrix.to_long_frame', AttendanceMatrix.to_long_frame, attendance_matrix)
+    code_flags = job.run_stage('AttendanceMatrix.code_flags', AttendanceMatrix.code_flags, attendance_matrix)
+
+    return date_list, attendance_matrix.employees, code_flags, unparsed_times_df, grouped_df
+
+
+# Each cached function below is keyed on the content hashes of the files it depends on;
+# arguments starting with an underscore are passed through without being hashed by Streamlit.
+# Functions only run (and show up in the profiler) when they miss the cache.
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def summarize_codes(attendance_hash, master_list_hash, schedule_hash, _grouped_df, _code_flags, _profiler):
+    # Every metric and chart counts the code flags of the attendance matrix
+    code_counts = AnalysisUtils.metric_count(_grouped_df, _code_flags)
+    manager_df = _profiler.run('analytics: count_codes_per_manager', AnalysisUtils.count_codes_per_manager, _grouped_df, _code_flags)
+    date_df = _profiler.run('analytics: count_code_per_date', AnalysisUtils.count_code_per_date, _grouped_df, _code_flags)
+
+    return code_counts, manager_df, date_df
+
+
+# Figures are built from the small pre-aggregated frames and cached per dataset, code and filter
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES * 4, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def plot_code_charts(attendance_hash, master_list_hash, schedule_hash, code, _manager_df, _date_df):
+    return (AnalysisUtils.plot_leaders_by_code_occurrence(_manager_df, code),
+            AnalysisUtils.plot_code_occurrence_by_date(_date_df, code))
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES * 4, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def plot_remarks(attendance_hash, master_list_hash, schedule_hash, filter_key, _grouped_df):
+    return AnalysisUtils.plot_remark_categories(AnalysisUtils.count_remark_categories(_grouped_df))
+
+
+# The filter index is read-only, so it is shared without copying
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def build_filter_index(attendance_hash, master_list_hash, schedule_hash, _grouped_df, _employee_df):
+    # Employer is not part of the long-format data, so map it from the employee details by work number
+    employers = _employee_df.drop_duplicates(subset='WB Work Number').set_index('WB Work Number')['Employer']
+
+    return FilterIndex({
+        'Employee Name': _grouped_df['Employee Name'],
+        'LOB': _grouped_df['LOB'],
+        'Shift': _grouped_df['Shift'],
+        'Site': _grouped_df['Site'],
+        'Manager': _grouped_df['Manager'],
+        'Employer': employers.reindex(_grouped_df['WB Work Number'].values).values
+    })
+
+
+# Row order of the Cleaned Data table per filter, search and sort; the pages themselves are cheap slices
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES * 4, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def table_positions(attendance_hash, master_list_hash, schedule_hash, filter_key, search, sort_column, ascending, _grouped_df):
+    positions = TableUtils.search_positions(_grouped_df, search)
+    if sort_column:
+        positions = TableUtils.sort_positions(_grouped_df, positions, sort_column, ascending)
+    return positions
+
+
+# The SQL query engine only sees the processed data of one upload, never files on the server
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner=False)
+def build_query_engine(attendance_hash, master_list_hash, schedule_hash, _grouped_df):
+    query_engine = QueryEngine(external_access=False)
+    query_engine.register_frame('attendance', _grouped_df)
+    return query_engine
+
+
+im = Image.open("images/neusoft_logo.png")
+
 st.set_page_config(page_title="Neusoft MNL", 
                    page_icon=im,
                    layout="wide", 
@@ -32,38 +153,58 @@ attendance_file = file_up1.file_uploader(label="Attendance Raw Data:", type="xls
 master_list_file = file_up2.file_uploader(label="Master List:", type="xlsx")
 schedule_file = file_up3.file_uploader(label="Schedule:", type="xlsx")
 
+# Optional debug panel with per-stage timings, row counts and peak memory
+show_profile = st.checkbox('Show pipeline profile')
+profiler = PipelineProfiler(track_memory=show_profile)
+
 # Read the Excel file using pandas
 if attendance_file is not None and master_list_file is not None and schedule_file is not None:
 
     try:
-        master_list_df = CleaningUtils.create_master_employee_list(master_list_file)
-        sched_df = CleaningUtils.create_schedule_dataframe(schedule_file)
-        attendance_df, date_list = CleaningUtils.generate_attendance_dataframe(attendance_file)
-
-        merged_df = CleaningUtils.incorporate_master_data(attendance_df, master_list_df, date_list)
-
-        applied_codes_df = CleaningUtils.update_attendance_codes(merged_df, sched_df)
-
-
-        # Clean time data in attendance date columns using the helper function
-        applied_codes_df.iloc[:, 10:] = applied_codes_df.iloc[:, 10:].apply(CleaningUtils.clean_time, axis=1)
-
-        # Remove whitespaces from attendance date columns
-        for col in applied_codes_df.columns[10:]:
-            applied_codes_df[col] = applied_codes_df[col].str.replace(r'\s+', '', regex=True)
-          
-        # # Debugging: Print some values before the error line
-        # st.caption("Applied codes")
-        # st.dataframe(applied_codes_df)
-        # st.caption("Sched")
-        # st.dataframe(sched_df)
-      
-        cleaned_df = CleaningUtils.merge_final_attendance_codes(CleaningUtils, applied_codes_df, sched_df)
-        grouped_df = CleaningUtils.transform_attendance_data(cleaned_df)
+        attendance_hash = file_content_hash(attendance_file)
+        master_list_hash = file_content_hash(master_list_file)
+        schedule_hash = file_content_hash(schedule_file)
+
+        # Run the pipeline in the background, or pick up the run already submitted for these files
+        job_key = (attendance_hash, master_list_hash, schedule_hash)
+        job = get_job_runner().submit(job_key, run_attendance_pipeline, PIPELINE_STAGE_COUNT,
+                                      attendance_file.getvalue(), master_list_file.getvalue(), schedule_file.getvalue(),
+                                      load_attendance_rules(), track_memory=show_profile)
+
+        if not job.finished:
+            st.progress(job.progress, text=f"Processing: {job.current_stage or 'queued'} ({job.completed_stages}/{job.stage_count} stages)")
+            if st.button('Cancel processing'):
+                job.cancel()
+            # Poll the job until it finishes
+            time.sleep(JOB_POLL_SECONDS)
+            st.rerun()
+
+        if job.status == 'cancelled':
+            st.warning('Processing was cancelled.', icon="⚠️")
+            if st.button('Restart processing'):
+                get_job_runner().discard(job_key)
+                st.rerun()
+            st.stop()
+
+        if job.status == 'failed':
+            # Failed runs are shared like finished ones, so any session can start a fresh run; the error is shown below
+            if st.button('Restart processing'):
+                get_job_runner().discard(job_key)
+                st.rerun()
+            raise job.error
+
+        # The results are shared by every session and rerun, so they are only read from here on
+        date_list, employee_df, code_flags, unparsed_times_df, grouped_df = job.result
+
+        if not unparsed_times_df.empty:
+            st.warning(f"{len(unparsed_times_df)} schedule/attendance time entries could not be parsed and were left without (L)/(OT) codes.", icon="⚠️")
+            with st.expander("Unparsed time entries"):
+                st.dataframe(unparsed_times_df, use_container_width=True)
 
         st.subheader(f"Attendance Report from {datetime.strptime(date_list[0], '%Y-%m-%d').strftime('%B %d, %Y')} to {datetime.strptime(date_list[-1], '%Y-%m-%d').strftime('%B %d, %Y')}", divider='grey')
 
-        mis_count, mul_count, absent_count, late_count = AnalysisUtils.metric_count(grouped_df)
+        (mis_count, mul_count, absent_count, late_count), manager_df, date_df = summarize_codes(
+            attendance_hash, master_list_hash, schedule_hash, grouped_df, code_flags, profiler)
         
         m1, m2, m3, m4 = st.columns(4)
         m1.metric("Missed Punch Count", mis_count)
@@ -73,79 +214,108 @@ if attendance_file is not None and master_list_file is not None and schedule_fil
 
         code = st.radio(' ', options=['(MIS)', '(MUL)', '(ABSENT)', '(L)'], horizontal=True)
 
-        manager_df = AnalysisUtils.count_codes_per_manager(grouped_df)
-        date_df = AnalysisUtils.count_code_per_date(grouped_df)
-
-        code_per_manager_fig = AnalysisUtils.plot_leaders_by_code_occurrence(manager_df, code)
-        code_per_date_fig = AnalysisUtils.plot_code_occurrence_by_date(date_df, code)
+        code_per_manager_fig, code_per_date_fig = plot_code_charts(attendance_hash, master_list_hash, schedule_hash, code, manager_df, date_df)
 
         viz1, viz2 = st.columns(2)
         viz1.plotly_chart(code_per_manager_fig, use_container_width=True)
         viz2.plotly_chart(code_per_date_fig, use_container_width=True)
 
+        filter_index = build_filter_index(attendance_hash, master_list_hash, schedule_hash, grouped_df, employee_df)
+
         with st.sidebar:
             st.header("Data Filter", divider='grey')
             st.caption('Select or input options according to your preferences')
-            employees = st.multiselect('Employee Name:', cleaned_df['Employee Name'].unique(), placeholder='')
-            lob = st.multiselect('LOB:', cleaned_df['LOB'].unique(), placeholder='')
-            shift = st.multiselect('Shift:', cleaned_df['Shift'].unique(), placeholder='')
-            site = st.multiselect('Site:', cleaned_df['Site'].unique(), placeholder='')
-            leader = st.multiselect('Leader:', cleaned_df['Manager'].unique(), placeholder='')
-            employer = st.multiselect('Employer:', cleaned_df['Employer'].unique(), placeholder='')
+            employees = st.multiselect('Employee Name:', filter_index.options['Employee Name'], placeholder='')
+            lob = st.multiselect('LOB:', filter_index.options['LOB'], placeholder='')
+            shift = st.multiselect('Shift:', filter_index.options['Shift'], placeholder='')
+            site = st.multiselect('Site:', filter_index.options['Site'], placeholder='')
+            leader = st.multiselect('Leader:', filter_index.options['Manager'], placeholder='')
+            employer = st.multiselect('Employer:', filter_index.options['Employer'], placeholder='')
 
             st.markdown('---')
             st.caption('@Neusoft')
 
-        if employees:
-            grouped_df = grouped_df[grouped_df['Employee Name'].isin(employees)]
-        if lob:
-            grouped_df = grouped_df[grouped_df['LOB'].isin(lob)]
-        if shift:
-            grouped_df = grouped_df[grouped_df['Shift'].isin(shift)]
-        if site:
-            grouped_df = grouped_df[grouped_df['Site'].isin(site)]
-        if leader:
-            grouped_df = grouped_df[grouped_df['Manager'].isin(leader)]
-        if employer:
-            grouped_df = grouped_df[grouped_df['Employer'].isin(employer)]    
+        filter_selections = {
+            'Employee Name': employees,
+            'LOB': lob,
+            'Shift': shift,
+            'Site': site,
+            'Manager': leader,
+            'Employer': employer
+        }
+
+        # Intersect the selected filters on the index and take the matching rows in one step
+        filtered_positions = filter_index.filter(filter_selections)
+        if len(filtered_positions) < len(grouped_df):
+            grouped_df = grouped_df.iloc[filtered_positions]
 
 
         with st.spinner('Processing'):
 
-            remarks_count_df = grouped_df['Remarks'].value_counts().rename_axis('Remarks').reset_index(name='Count')
-            max_count_value = remarks_count_df['Count'].max()
-            figure = px.bar(
-                remarks_count_df.sort_values(by='Count', ascending=True),
-                x="Count",
-                y="Remarks",
-                orientation='h',
-                title="Remarks' Value Counts"
-            )
+            filter_key = tuple((dimension, tuple(values)) for dimension, values in filter_selections.items())
+            figure = plot_remarks(attendance_hash, master_list_hash, schedule_hash, filter_key, grouped_df)
             st.plotly_chart(figure, use_container_width=True)
 
             st.subheader("Cleaned Data", divider='grey')
             st.write('Click the arrow at the upper-left corner to view the Filter pane of this data.')
 
-            # buffer to use for excel writer
-            buffer = io.BytesIO()
-
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                # Write the styled DataFrame to Excel
-                grouped_df.to_excel(writer, sheet_name='Neusoft_MNL_attendance)', index=False)
-
-            # Reset the buffer position
-            buffer.seek(0)
-
-            # Displaying the new DataFrame with styled cells
-            st.dataframe(grouped_df, use_container_width=True)
-
-            # Provide a download button
-            download = st.download_button(
-                label="Download Data as Excel",
-                data=buffer,
-                file_name='neusoft_mnl_attendance.xlsx',
-                mime='application/vnd.ms-excel'
-            )
+            # Only the current page is sent to the browser; search and sort run on the server
+            search_col, sort_col, order_col, size_col = st.columns([3, 2, 1, 1])
+            search = search_col.text_input('Search:', placeholder='Text in any column')
+            sort_column = sort_col.selectbox('Sort by:', options=[None, *grouped_df.columns], format_func=lambda column: column or 'Original order')
+            ascending = order_col.radio('Order:', options=['Ascending', 'Descending'], disabled=sort_column is None) == 'Ascending'
+            page_size = size_col.selectbox('Rows per page:', options=TableUtils.PAGE_SIZES, index=1)
+
+            positions = table_positions(attendance_hash, master_list_hash, schedule_hash, filter_key, search, sort_column, ascending, grouped_df)
+            page_count = TableUtils.page_count(len(positions), page_size)
+            # A new search, sort or filter starts again from the first page
+            page_key = hashlib.sha256(repr((filter_key, search, sort_column, ascending, page_size)).encode()).hexdigest()
+            page_number = st.number_input(f'Page (of {page_count:,}):', min_value=1, max_value=page_count, value=1, step=1, key=f'table_page_{page_key}')
+
+            page_df, first_row, _ = TableUtils.page(grouped_df, positions, page_number, page_size)
+            st.caption(f'Rows {first_row:,} to {first_row + len(page_df) - 1:,} of {len(positions):,}' if len(page_df) else 'No matching rows.')
+            st.dataframe(page_df, use_container_width=True)
+
+            # Only build the export file when the user asks for it
+            export_format = st.radio('Download format:', options=list(ExportUtils.EXPORT_FORMATS), horizontal=True)
+            extension, mime = ExportUtils.EXPORT_FORMATS[export_format]
+
+            if st.button(f"Prepare {export_format} Download"):
+                with profiler.run('export', ExportUtils.export, grouped_df, export_format) as exported_file:
+                    # Hand the spooled file to the download button as a reader over its file descriptor,
+                    # so the export is not copied into a bytes object here first
+                    with open(exported_file.fileno(), 'rb', closefd=False) as export_reader:
+                        download = st.download_button(
+                            label=f"Download Data as {export_format}",
+                            data=export_reader,
+                            file_name=f'neusoft_mnl_attendance.{extension}',
+                            mime=mime
+                        )
+
+        # Optional ad-hoc SQL over the unfiltered data, when DuckDB is installed
+        if QueryEngine.is_available():
+            with st.expander("SQL query"):
+                st.caption(f"Query the processed data as the `attendance` table ({', '.join(grouped_df.columns)}); up to {QUERY_MAX_ROWS:,} rows are shown.")
+                sql = st.text_area('Query:', value='SELECT Manager, COUNT(*) AS Records FROM attendance GROUP BY Manager ORDER BY Records DESC')
+                if st.button('Run query'):
+                    query_engine = build_query_engine(attendance_hash, master_list_hash, schedule_hash, job.result[-1])
+                    try:
+                        query_df = profiler.run('query', query_engine.query, sql, QUERY_MAX_ROWS)
+                        st.dataframe(query_df, use_container_width=True)
+                    except ValueError as error:
+                        st.error(str(error), icon="🚨")
+
+        if show_profile:
+            with st.expander("Pipeline profile", expanded=True):
+                st.caption('Stages of the background pipeline run, then the analytics and exports of this rerun (those served from the cache are not listed).')
+                profile_df = pd.concat([job.profiler.to_frame(), profiler.to_frame()], ignore_index=True)
+                st.dataframe(profile_df, use_container_width=True)
+                st.download_button(
+                    label="Download Profile as JSON",
+                    data=profile_df.to_json(orient='records', indent=2),
+                    file_name='pipeline_profile.json',
+                    mime='application/json'
+                )
     # except ValueError:
     #     # Handle ValueError
     #     st.error('You uploaded mismatched files. Make sure to upload files to their corresponding File Uploader tab.', icon="🚨")
@@ -155,4 +325,7 @@ if attendance_file is not None and master_list_file is not None and schedule_fil
     except IndexError:
         # Handle IndexError
         st.error('You uploaded a wrong file.', icon="🚨")
+    except ValueError as error:
+        # Handle schedule layout and attendance rules errors, e.g. a sheet covering other dates than the rest
+        st.error(str(error), icon="🚨")
       
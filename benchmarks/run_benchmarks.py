@@ -0,0 +1,166 @@
+"""
+Benchmark harness for the attendance pipeline.
+
+Times every CleaningUtils and AnalysisUtils stage, the exports and the end-to-end pipeline
+on synthetic workbooks (generated on first use by synthetic_data.py), prints the results
+next to the previous recorded run and appends them to a JSON-lines history file, so
+regressions show up over time.
+
+Example:
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 50000 --days 31 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from functions import CleaningUtils, AttendanceMatrix, AnalysisUtils, ExportUtils, PipelineProfiler
+from synthetic_data import generate_dataset
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dataset_paths(data_dir, employees, days):
+    # Generated workbooks are reused between runs
+    output_dir = os.path.join(data_dir, f'{employees}x{days}')
+    paths = {name: os.path.join(output_dir, f'{name}.xlsx') for name in ['attendance', 'master_list', 'schedule']}
+    if not all(os.path.exists(path) for path in paths.values()):
+        print(f'Generating {employees} employees x {days} days in {output_dir}', file=sys.stderr)
+        paths = generate_dataset(output_dir, employees, days)
+    return paths
+
+
+def run_pipeline(paths):
+    master_list_df = CleaningUtils.create_master_employee_list(paths['master_list'])
+    sched_df = CleaningUtils.create_schedule_dataframe(paths['schedule'])
+    attendance_df, date_list = CleaningUtils.generate_attendance_dataframe(paths['attendance'])
+    merged_df = CleaningUtils.incorporate_master_data(attendance_df, master_list_df, date_list)
+    _, _, grouped_df = CleaningUtils.process_attendance_codes(merged_df, sched_df)
+    code_flags = AnalysisUtils.extract_code_flags(grouped_df)
+    AnalysisUtils.metric_count(grouped_df, code_flags)
+    AnalysisUtils.count_codes_per_manager(grouped_df, code_flags)
+    AnalysisUtils.count_code_per_date(grouped_df, code_flags)
+    return grouped_df
+
+
+def benchmark_cases(paths):
+    """
+    Builds the benchmark cases of one dataset.
+
+    Every case is (name, setup, function): setup() returns fresh arguments for function, so
+    stages that modify their inputs in place are timed on the same data every repeat.
+    """
+    master_list_df = CleaningUtils.create_master_employee_list(paths['master_list'])
+    sched_df = CleaningUtils.create_schedule_dataframe(paths['schedule'])
+    attendance_df, date_list = CleaningUtils.generate_attendance_dataframe(paths['attendance'])
+    merged_df = CleaningUtils.incorporate_master_data(attendance_df.copy(), master_list_df, date_list)
+    applied_codes_df = CleaningUtils.update_attendance_codes(merged_df.copy(), sched_df)
+    cleaned_time_df = CleaningUtils.clean_time_data(applied_codes_df.copy())
+    cleaned_df, _ = CleaningUtils.merge_final_attendance_codes(CleaningUtils, cleaned_time_df.copy(), sched_df)
+    grouped_df = CleaningUtils.transform_attendance_data(cleaned_df)
+    attendance_matrix, _ = CleaningUtils.encode_attendance_matrix(merged_df, sched_df)
+    code_flags = AnalysisUtils.extract_code_flags(grouped_df)
+    manager_df = AnalysisUtils.count_codes_per_manager(grouped_df, code_flags)
+    date_df = AnalysisUtils.count_code_per_date(grouped_df, code_flags)
+
+    cases = [
+        ('CleaningUtils.create_master_employee_list', lambda: (paths['master_list'],), CleaningUtils.create_master_employee_list),
+        ('CleaningUtils.create_schedule_dataframe', lambda: (paths['schedule'],), CleaningUtils.create_schedule_dataframe),
+        ('CleaningUtils.generate_attendance_dataframe', lambda: (paths['attendance'],), CleaningUtils.generate_attendance_dataframe),
+        ('CleaningUtils.incorporate_master_data', lambda: (attendance_df.copy(), master_list_df, date_list),
+         CleaningUtils.incorporate_master_data),
+        ('CleaningUtils.update_attendance_codes', lambda: (merged_df.copy(), sched_df), CleaningUtils.update_attendance_codes),
+        ('CleaningUtils.clean_time_data', lambda: (applied_codes_df.copy(),), CleaningUtils.clean_time_data),
+        ('CleaningUtils.merge_final_attendance_codes', lambda: (CleaningUtils, cleaned_time_df.copy(), sched_df),
+         CleaningUtils.merge_final_attendance_codes),
+        ('CleaningUtils.transform_attendance_data', lambda: (cleaned_df,), CleaningUtils.transform_attendance_data),
+        ('CleaningUtils.encode_attendance_matrix', lambda: (merged_df, sched_df), CleaningUtils.encode_attendance_matrix),
+        ('AttendanceMatrix.to_long_frame', lambda: (attendance_matrix,), AttendanceMatrix.to_long_frame),
+        ('AnalysisUtils.extract_code_flags', lambda: (grouped_df,), AnalysisUtils.extract_code_flags),
+        ('AnalysisUtils.metric_count', lambda: (grouped_df, code_flags), AnalysisUtils.metric_count),
+        ('AnalysisUtils.count_codes_per_manager', lambda: (grouped_df, code_flags), AnalysisUtils.count_codes_per_manager),
+        ('AnalysisUtils.count_code_per_date', lambda: (grouped_df, code_flags), AnalysisUtils.count_code_per_date),
+        ('AnalysisUtils.plot_leaders_by_code_occurrence', lambda: (manager_df, '(MIS)'), AnalysisUtils.plot_leaders_by_code_occurrence),
+        ('AnalysisUtils.plot_code_occurrence_by_date', lambda: (date_df, '(MIS)'), AnalysisUtils.plot_code_occurrence_by_date),
+        ('AnalysisUtils.count_remark_categories', lambda: (grouped_df,), AnalysisUtils.count_remark_categories),
+    ]
+    for file_format in ExportUtils.EXPORT_FORMATS:
+        cases.append((f'ExportUtils.export ({file_format})', lambda file_format=file_format: (grouped_df, file_format),
+                      lambda data_frame, file_format: ExportUtils.export(data_frame, file_format).close()))
+    cases.append(('end-to-end pipeline', lambda: (paths,), run_pipeline))
+
+    return cases
+
+
+def load_history(results_path):
+    # Latest recorded median per (employees, days, benchmark)
+    history = {}
+    if os.path.exists(results_path):
+        with open(results_path, encoding='utf-8') as file:
+            for line in file:
+                record = json.loads(line)
+                history[(record['employees'], record['days'], record['benchmark'])] = record
+    return history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the attendance pipeline on synthetic workbooks.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='Employee counts to benchmark (default: 1000).')
+    parser.add_argument('--days', type=int, default=31, help='Attendance dates per dataset (default: 31).')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark (default: 3).')
+    parser.add_argument('--memory', action='store_true', help='Also measure the peak memory of each benchmark in one extra run.')
+    parser.add_argument('--filter', help='Only run benchmarks whose name contains this text.')
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'), help='Directory for the generated workbooks.')
+    parser.add_argument('--results', default=os.path.join(BENCHMARK_DIR, 'results.jsonl'), help='JSON-lines history of benchmark results.')
+    args = parser.parse_args(argv)
+
+    history = load_history(args.results)
+    run_info = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit()}
+
+    with open(args.results, 'a', encoding='utf-8') as results_file:
+        for employees in args.sizes:
+            paths = dataset_paths(args.data_dir, employees, args.days)
+            print(f'\n{employees} employees x {args.days} days')
+            print(f"{'benchmark':<50}{'min (s)':>10}{'median (s)':>12}{'previous':>12}{'change':>9}{'peak (MB)':>11}")
+
+            for name, setup, function in benchmark_cases(paths):
+                if args.filter and args.filter not in name:
+                    continue
+
+                profiler = PipelineProfiler()
+                for _ in range(args.repeat):
+                    profiler.run(name, function, *setup())
+                seconds = [record['Seconds'] for record in profiler.records]
+
+                peak_memory_mb = None
+                if args.memory:
+                    memory_profiler = PipelineProfiler(track_memory=True)
+                    memory_profiler.run(name, function, *setup())
+                    peak_memory_mb = memory_profiler.records[0]['Peak Memory (MB)']
+
+                record = dict(run_info, employees=employees, days=args.days, benchmark=name, repeat=args.repeat,
+                              min=min(seconds), median=statistics.median(seconds), peak_memory_mb=peak_memory_mb)
+                results_file.write(json.dumps(record) + '\n')
+
+                previous = history.get((employees, args.days, name))
+                previous_median = f"{previous['median']:.3f}" if previous else '-'
+                change = f"{(record['median'] / previous['median'] - 1) * 100:+.0f}%" if previous and previous['median'] else '-'
+                peak = f'{peak_memory_mb:.1f}' if peak_memory_mb is not None else '-'
+                print(f"{name:<50}{record['min']:>10.3f}{record['median']:>12.3f}{previous_median:>12}{change:>9}{peak:>11}")
+
+
+if __name__ == '__main__':
+    main()
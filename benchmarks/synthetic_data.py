@@ -0,0 +1,241 @@
+"""
+Synthetic workbook generator for the attendance pipeline benchmarks.
+
+Writes the three workbooks the app expects, in the same layout as the real extracts:
+a DingTalk '打卡时间' attendance workbook (multi-line punch cells, "外勤" field-work
+markers, missed and extra punches), an Active/Inactive master list and an RBC/HSQ/ISA
+schedule workbook with shift times and schedule codes.
+
+Example:
+    python benchmarks/synthetic_data.py --employees 10000 --days 31 --output-dir benchmarks/data/10000x31
+"""
+
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import xlsxwriter
+
+LOBS = ['RBC', 'HSQ', 'ISA']
+SITES = ['Ortigas', 'Makati', 'BGC']
+SHIFTS = {
+    'Day': ('09:00AM', '06:00PM', 9 * 60),
+    'Mid': ('01:00PM', '10:00PM', 13 * 60),
+    'Night': ('10:00PM', '07:00AM', 22 * 60)
+}
+SCHEDULE_CODES = ['OFF', 'VL', 'SL', 'TRN', 'HD', 'ABSA', 'NCNS', 'RDOT', 'EL']
+MASTER_COLUMNS = ['Employee Name', 'Employee Code (ID)', 'WB Work Number', 'RAG', 'Work Location',
+                  'Shift', 'Site', 'LOB', 'Leader', 'Employer']
+
+
+def format_minutes(minutes):
+    minutes = int(minutes) % (24 * 60)
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def generate_employees(employees, seed=0):
+    """
+    Generates the employee roster shared by the three workbooks.
+
+    Args:
+        employees (int): Number of employees in the attendance extract.
+        seed (int): Random seed.
+
+    Returns:
+        list: One dict per employee.
+    """
+    rng = np.random.default_rng(seed)
+    leaders = [f'Leader {i:03d}' for i in range(max(1, employees // 20))]
+    shift_names = list(SHIFTS)
+
+    roster = []
+    for i in range(employees):
+        roster.append({
+            'Employee Name': f'Employee {i:06d}',
+            'Employee Code (ID)': f'NS{100000 + i}',
+            'WB Work Number': f'WB{200000 + i}',
+            'RAG': rng.choice(['Green', 'Amber', 'Red'], p=[0.7, 0.2, 0.1]),
+            'Work Location': 'MNL',
+            'Shift': shift_names[rng.choice(3, p=[0.6, 0.2, 0.2])],
+            'Site': SITES[rng.integers(len(SITES))],
+            'LOB': LOBS[rng.integers(len(LOBS))],
+            'Leader': leaders[rng.integers(len(leaders))],
+            'Employer': rng.choice(['Neusoft', 'Agency'], p=[0.9, 0.1])
+        })
+    return roster
+
+
+def write_master_list(path, roster, inactive_share=0.2, seed=0):
+    """
+    Writes the Active/Inactive master list; inactive staff include people who left before the extract.
+
+    Args:
+        path (str): Destination workbook.
+        roster (list): Output of generate_employees.
+        inactive_share (float): Extra inactive records, as a share of the roster.
+        seed (int): Random seed.
+    """
+    rng = np.random.default_rng(seed + 1)
+    inactive = [dict(employee, **{'Employee Name': f'Former {i:06d}', 'WB Work Number': f'WB{900000 + i}'})
+                for i, employee in enumerate(rng.choice(roster, int(len(roster) * inactive_share)))]
+    # A few roster members moved to the Inactive sheet
+    moved = set(rng.choice(len(roster), len(roster) // 100, replace=False).tolist())
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    for sheet_name, records in [('Active', [e for i, e in enumerate(roster) if i not in moved]),
+                                ('Inactive', [e for i, e in enumerate(roster) if i in moved] + inactive)]:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, MASTER_COLUMNS)
+        for row_number, record in enumerate(records, start=1):
+            worksheet.write_row(row_number, 0, [str(record[column]) for column in MASTER_COLUMNS])
+    workbook.close()
+
+
+def write_schedule(path, roster, dates, seed=0):
+    """
+    Writes the RBC/HSQ/ISA schedule workbook: a date header row, two filler rows and one row per employee.
+
+    Args:
+        path (str): Destination workbook.
+        roster (list): Output of generate_employees.
+        dates (list): Schedule dates.
+        seed (int): Random seed.
+
+    Returns:
+        dict: The schedule cell per (work number, date index), reused for the punches.
+    """
+    rng = np.random.default_rng(seed + 2)
+    schedule = {}
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    for lob in LOBS:
+        worksheet = workbook.add_worksheet(lob)
+        worksheet.write_row(0, 0, ['No.', 'Employee Number', 'LOB', 'Employee ID', 'Work Number', 'Name']
+                            + [f'Day {i + 1}' for i in range(len(dates))])
+        worksheet.write_row(1, 0, ['', '', '', '', '', ''])
+        for column, schedule_date in enumerate(dates, start=6):
+            worksheet.write_datetime(1, column, datetime.combine(schedule_date, datetime.min.time()), date_format)
+        worksheet.write(2, 0, 'Schedule')
+        worksheet.write(3, 0, 'Shift')
+
+        row_number = 4
+        for index, employee in enumerate(e for e in roster if e['LOB'] == lob):
+            start, end, _ = SHIFTS[employee['Shift']]
+            worksheet.write_row(row_number, 0, [index + 1, employee['Employee Code (ID)'], lob,
+                                                employee['Employee Code (ID)'], employee['WB Work Number'],
+                                                employee['Employee Name']])
+            draws = rng.random(len(dates))
+            for day, draw in enumerate(draws):
+                if day % 7 in (5, 6) or draw < 0.06:
+                    cell = 'OFF' if day % 7 in (5, 6) else SCHEDULE_CODES[rng.integers(len(SCHEDULE_CODES))]
+                elif draw < 0.07:
+                    cell = None
+                else:
+                    cell = f'{start} - {end}'
+                schedule[(employee['WB Work Number'], day)] = cell
+                if cell is not None:
+                    worksheet.write_string(row_number, 6 + day, cell)
+            row_number += 1
+    workbook.close()
+
+    return schedule
+
+
+def punch_cell(rng, shift_start, scheduled):
+    """Builds one raw DingTalk punch cell for a working day, or None when nobody punched."""
+    if not scheduled:
+        return None if rng.random() < 0.9 else format_minutes(shift_start + rng.integers(-30, 30))
+
+    draw = rng.random()
+    if draw < 0.05:
+        return None
+    check_in = shift_start + int(rng.normal(-8, 10))
+    check_out = shift_start + 9 * 60 + int(abs(rng.normal(5, 20)))
+    punches = [format_minutes(check_in), format_minutes(check_out)]
+    if draw < 0.12:
+        punches = punches[:1]
+    elif draw < 0.20:
+        punches.insert(1, format_minutes(shift_start + 4 * 60 + rng.integers(0, 60)))
+    if rng.random() < 0.05:
+        punches = [f'外勤{punch}' for punch in punches]
+    return '\n'.join(punches)
+
+
+def write_attendance(path, roster, dates, schedule, seed=0):
+    """
+    Writes the '打卡时间' attendance workbook: the date range in the first header cell,
+    two sub-header rows and one row per employee with one punch cell per date.
+
+    Args:
+        path (str): Destination workbook.
+        roster (list): Output of generate_employees.
+        dates (list): Attendance dates.
+        schedule (dict): Output of write_schedule.
+        seed (int): Random seed.
+    """
+    rng = np.random.default_rng(seed + 3)
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('打卡时间')
+    worksheet.write_row(0, 0, [f'打卡时间 统计日期：{dates[0]:%Y-%m-%d} 至 {dates[-1]:%Y-%m-%d}']
+                        + [f'列{i}' for i in range(5 + len(dates))])
+    worksheet.write_row(1, 0, ['姓名', '考勤组', '部门', '工号', '职位', 'UserId'] + [f'{d:%d}' for d in dates])
+    worksheet.write_row(2, 0, [''] * 6 + [['一', '二', '三', '四', '五', '六', '日'][d.weekday()] for d in dates])
+
+    for row_number, employee in enumerate(roster, start=3):
+        work_number = employee['WB Work Number']
+        # Raw extracts spell work numbers inconsistently
+        raw_work_number = work_number if row_number % 3 else f'wb {work_number[2:]}'
+        worksheet.write_row(row_number, 0, [employee['Employee Name'], employee['LOB'], 'Operations',
+                                            raw_work_number, 'Agent', f'u{row_number}'])
+        shift_start = SHIFTS[employee['Shift']][2]
+        for day in range(len(dates)):
+            cell = schedule.get((work_number, day))
+            punches = punch_cell(rng, shift_start, cell is not None and ':' in cell)
+            if punches is not None:
+                worksheet.write_string(row_number, 6 + day, punches)
+    workbook.close()
+
+
+def generate_dataset(output_dir, employees, days=31, start_date=date(2024, 1, 1), seed=0):
+    """
+    Writes a full set of attendance, master list and schedule workbooks.
+
+    Args:
+        output_dir (str): Destination directory.
+        employees (int): Number of employees in the attendance extract.
+        days (int): Number of attendance dates.
+        start_date (date): First attendance date.
+        seed (int): Random seed.
+
+    Returns:
+        dict: Paths of the 'attendance', 'master_list' and 'schedule' workbooks.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, f'{name}.xlsx') for name in ['attendance', 'master_list', 'schedule']}
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+
+    roster = generate_employees(employees, seed)
+    write_master_list(paths['master_list'], roster, seed=seed)
+    schedule = write_schedule(paths['schedule'], roster, dates, seed=seed)
+    write_attendance(paths['attendance'], roster, dates, schedule, seed=seed)
+
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic attendance, master list and schedule workbooks.')
+    parser.add_argument('--employees', type=int, default=1000, help='Employees in the attendance extract (default: 1000).')
+    parser.add_argument('--days', type=int, default=31, help='Attendance dates (default: 31).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0).')
+    parser.add_argument('--output-dir', required=True, help='Directory for the generated workbooks.')
+    args = parser.parse_args(argv)
+
+    for name, path in generate_dataset(args.output_dir, args.employees, args.days, seed=args.seed).items():
+        print(f'{name}: {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+"""
+Headless entry point for the attendance data pipeline.
+
+Runs the same CleaningUtils chain as the Streamlit app on attendance workbooks
+(files or directories of .xlsx files) and writes the cleaned data to disk.
+
+Example:
+    python cli.py --attendance raw/ --master-list master.xlsx --schedule schedule.xlsx --output-dir out/
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from functions import CleaningUtils, AttendanceMatrix, AttendanceRules, ExportUtils, IncrementalUtils, SnapshotUtils, RollupUtils, QueryEngine, PipelineProfiler
+
+
+def collect_workbooks(paths):
+    """
+    Expands files and directories into a sorted list of Excel workbooks.
+
+    Args:
+        paths (list): File or directory paths.
+
+    Returns:
+        list: Paths of the .xlsx workbooks found.
+    """
+    workbooks = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            # Skip the lock files Excel leaves next to open workbooks
+            workbooks.extend(sorted(p for p in path.glob('*.xlsx') if not p.name.startswith('~$')))
+        else:
+            workbooks.append(path)
+    return workbooks
+
+
+def name_outputs(attendance_paths):
+    """
+    Names the output file and profile subdirectory of each attendance workbook: its file stem,
+    or, for stems shared by several workbooks, its path below their common directory.
+
+    Args:
+        attendance_paths (list): Attendance workbook paths.
+
+    Returns:
+        list: One name per workbook, in order.
+
+    Raises:
+        ValueError: If two workbooks would still get the same name.
+    """
+    resolved_paths = [path.resolve() for path in attendance_paths]
+    stem_counts = {}
+    for path in resolved_paths:
+        stem_counts[path.stem] = stem_counts.get(path.stem, 0) + 1
+
+    shared_paths = [path for path in resolved_paths if stem_counts[path.stem] > 1]
+    common_dir = Path(os.path.commonpath([path.parent for path in shared_paths])) if shared_paths else None
+
+    names = []
+    for path in resolved_paths:
+        if stem_counts[path.stem] > 1:
+            names.append('_'.join(path.relative_to(common_dir).with_suffix('').parts))
+        else:
+            names.append(path.stem)
+
+    seen = {}
+    for path, name in zip(attendance_paths, names):
+        if name in seen:
+            raise ValueError(f'{seen[name]} and {path} would both be written as {name}_cleaned')
+        seen[name] = path
+    return names
+
+
+def run_pipeline(attendance_path, master_list_df, sched_df, profiler, workers=1, shard_by='WB Work Number', rules=None):
+    """
+    Runs the attendance cleaning chain on one attendance workbook.
+
+    Args:
+        attendance_path (Path): Attendance raw data workbook.
+        master_list_df (pd.DataFrame): Output of CleaningUtils.create_master_employee_list.
+        sched_df (pd.DataFrame): Output of CleaningUtils.create_schedule_dataframe.
+        profiler (PipelineProfiler): Records the measurements of each stage.
+        workers (int): Worker processes for the coding, cleaning and transform stages; 1 runs them serially.
+        shard_by (str): Column the rows are sharded by when workers > 1 ('WB Work Number' or 'LOB').
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
+
+    Returns:
+        tuple: The long-format attendance DataFrame and the DataFrame of unparsed time entries.
+    """
+    attendance_df, date_list = profiler.run('generate_attendance_dataframe', CleaningUtils.generate_attendance_dataframe, attendance_path)
+
+    merged_df = profiler.run('incorporate_master_data', CleaningUtils.incorporate_master_data, attendance_df, master_list_df, date_list)
+
+    if workers > 1:
+        _, unparsed_times_df, grouped_df = profiler.run(
+            f'process_attendance_codes_in_parallel ({workers} workers)',
+            CleaningUtils.process_attendance_codes_in_parallel, merged_df, sched_df, workers, shard_by, rules)
+        return grouped_df, unparsed_times_df
+
+    attendance_matrix, unparsed_times_df = profiler.run('encode_attendance_matrix', CleaningUtils.encode_attendance_matrix,
+                                                        merged_df, sched_df, rules)
+
+    grouped_df = profiler.run('AttendanceMatrix.to_long_frame', AttendanceMatrix.to_long_frame, attendance_matrix)
+
+    return grouped_df, unparsed_times_df
+
+
+def run_incremental_pipeline(attendance_path, master_list_df, sched_df, store_dir, profiler, workers=1, rules=None):
+    """
+    Runs the attendance cleaning chain on the dates of one attendance workbook that are not
+    in the incremental store yet or whose punches/schedule changed.
+
+    Args:
+        attendance_path (Path): Attendance raw data workbook.
+        master_list_df (pd.DataFrame): Output of CleaningUtils.create_master_employee_list.
+        sched_df (pd.DataFrame): Output of CleaningUtils.create_schedule_dataframe.
+        store_dir (str): Incremental store directory.
+        profiler (PipelineProfiler): Records the measurements of each stage.
+        workers (int): Worker processes for the coding stages; 1 runs them serially.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
+
+    Returns:
+        tuple: The long-format attendance DataFrame, the DataFrame of unparsed time entries
+               and the list of re-processed dates.
+    """
+    attendance_df, date_list = profiler.run('generate_attendance_dataframe', CleaningUtils.generate_attendance_dataframe, attendance_path)
+
+    return profiler.run('process_attendance_incrementally', IncrementalUtils.process_attendance_incrementally,
+                        attendance_df, date_list, master_list_df, sched_df, store_dir, workers, rules)
+
+
+def write_output(grouped_df, output_path, output_format):
+    """
+    Writes the long-format attendance data to disk.
+
+    Args:
+        grouped_df (pd.DataFrame): Output of CleaningUtils.transform_attendance_data.
+        output_path (Path): Destination file without extension.
+        output_format (str): A key of ExportUtils.EXPORT_FORMATS.
+
+    Returns:
+        Path: The file written.
+    """
+    extension, _ = ExportUtils.EXPORT_FORMATS[output_format]
+    output_path = output_path.with_suffix(f'.{extension}')
+    ExportUtils.write_export(grouped_df, output_path, output_format)
+    return output_path
+
+
+def print_profile(title, profiler):
+    print(title, file=sys.stderr)
+    print(profiler.to_frame().to_string(index=False), file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Neusoft MNL attendance data pipeline without the web app.')
+    parser.add_argument('--attendance', nargs='+',
+                        help='Attendance raw data workbooks, or directories containing them.')
+    parser.add_argument('--master-list', help='Master list workbook (Active/Inactive sheets).')
+    parser.add_argument('--schedule', help='Schedule workbook.')
+    parser.add_argument('--schedule-sheets', nargs='+', metavar='SHEET',
+                        help='Schedule sheets to load, e.g. RBC HSQ ISA IDN BZ (default: the RBC, HSQ and ISA sheets found in the workbook).')
+    parser.add_argument('--rules', metavar='PATH',
+                        help='JSON config of the attendance codes and the late/overtime policies per LOB and site '
+                             '(default: the built-in rules).')
+    parser.add_argument('--output-dir', default='.', help='Directory for the cleaned files (default: current directory).')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for the schedule parse and the coding, cleaning and transform stages (default: 1, serial).')
+    parser.add_argument('--shard-by', choices=['WB Work Number', 'LOB'], default='WB Work Number',
+                        help='How rows are split between workers (default: work-number hash).')
+    parser.add_argument('--store',
+                        help='Incremental store directory: only new or changed dates are processed and appended to it.')
+    parser.add_argument('--snapshot-dir',
+                        help='Directory of Parquet snapshots of the parsed master list and schedule, reused while the workbooks are unchanged.')
+    parser.add_argument('--list-snapshots', action='store_true', help='List the snapshots in --snapshot-dir and exit.')
+    parser.add_argument('--evict-snapshots', nargs='*', metavar='HASH',
+                        help='Delete the snapshots in --snapshot-dir whose source hash starts with HASH '
+                             '(all snapshots when no HASH or --older-than is given) and exit.')
+    parser.add_argument('--older-than', type=float, metavar='DAYS',
+                        help='With --evict-snapshots, delete the snapshots not refreshed for DAYS days.')
+    parser.add_argument('--rollup', metavar='DIR',
+                        help='Roll-up store directory: the code flags of every processed workbook are added to it.')
+    parser.add_argument('--rollup-report', metavar='PERIOD',
+                        help='Print the code counts in --rollup for PERIOD (YTD, YYYY, YYYY-Qn or YYYY-MM) and exit.')
+    parser.add_argument('--rollup-by', nargs='+', default=['Manager'], metavar='COLUMN',
+                        help='Columns the --rollup-report counts are grouped by, e.g. Month LOB (default: Manager).')
+    parser.add_argument('--query', metavar='SQL',
+                        help='Run a SQL SELECT (needs duckdb) over the attendance_history view of --store and the '
+                             'code_flags view of --rollup, print the result and exit.')
+    parser.add_argument('--profile-json', metavar='PATH',
+                        help='Write the per-stage wall time, row counts and peak memory to this JSON file.')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Measure the peak memory of each stage (slows the run down).')
+    parser.add_argument('--profile-dir',
+                        help='Write a profile of every stage into this directory.')
+    parser.add_argument('--profiler', choices=['cprofile', 'pyinstrument'], default='cprofile',
+                        help='Profiler used with --profile-dir (default: cprofile).')
+    parser.add_argument('--format', choices=list(ExportUtils.EXPORT_FORMATS), default='Excel',
+                        help='Output file format (default: Excel).')
+    args = parser.parse_args(argv)
+
+    if (args.list_snapshots or args.evict_snapshots is not None) and not args.snapshot_dir:
+        parser.error('--list-snapshots and --evict-snapshots require --snapshot-dir')
+    if args.rollup_report and not args.rollup:
+        parser.error('--rollup-report requires --rollup')
+    if args.query and not (args.store or args.rollup):
+        parser.error('--query requires --store or --rollup')
+    if args.query and not QueryEngine.is_available():
+        parser.error('--query requires the duckdb package')
+    if args.rollup_report:
+        try:
+            args.rollup_dates = RollupUtils.period_dates(args.rollup_report)
+        except ValueError as error:
+            parser.error(str(error))
+    elif not (args.query or args.list_snapshots or args.evict_snapshots is not None) and not (args.attendance and args.master_list and args.schedule):
+        parser.error('--attendance, --master-list and --schedule are required')
+
+    return args
+
+
+def manage_snapshots(args):
+    if args.evict_snapshots is not None:
+        for file_name in SnapshotUtils.evict_snapshots(args.snapshot_dir, args.evict_snapshots, args.older_than):
+            print(f'Evicted {file_name}')
+
+    if args.list_snapshots:
+        snapshots = SnapshotUtils.list_snapshots(args.snapshot_dir)
+        print(snapshots.drop(columns='File').to_string(index=False) if not snapshots.empty else 'No snapshots.')
+
+
+def print_rollup_report(args):
+    start_date, end_date = args.rollup_dates
+    code_counts = RollupUtils.count_codes(args.rollup, args.rollup_by, start_date, end_date)
+    if code_counts.empty:
+        print(f'No records between {start_date} and {end_date}.')
+        return
+
+    report = code_counts.pivot_table(index=args.rollup_by, columns='Status', values='Count', aggfunc='sum', fill_value=0)
+    report = report.reindex(columns=code_counts['Status'].unique())
+    print(f'{start_date} to {end_date}')
+    print(report.to_string())
+
+
+def print_query(args):
+    query_engine = QueryEngine()
+    if args.store:
+        query_engine.register_incremental_store(args.store)
+    if args.rollup:
+        query_engine.register_rollup_store(args.rollup)
+
+    try:
+        print(query_engine.query(args.query).to_string(index=False))
+    except ValueError as error:
+        print(f'Query failed: {error}', file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.query:
+        return print_query(args)
+
+    if args.rollup_report:
+        print_rollup_report(args)
+        return 0
+
+    if args.list_snapshots or args.evict_snapshots is not None:
+        manage_snapshots(args)
+        return 0
+
+    attendance_paths = collect_workbooks(args.attendance)
+    if not attendance_paths:
+        print('No attendance workbooks found.', file=sys.stderr)
+        return 1
+
+    try:
+        output_names = name_outputs(attendance_paths)
+    except ValueError as error:
+        print(f'Conflicting attendance workbooks: {error}', file=sys.stderr)
+        return 1
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        rules = AttendanceRules.load(args.rules) if args.rules else None
+    except (OSError, ValueError) as error:
+        print(f'Cannot load the attendance rules: {error}', file=sys.stderr)
+        return 1
+
+    # Stage profiles of each workbook go into their own subdirectory of --profile-dir
+    new_profiler = lambda name: PipelineProfiler(args.profile_memory, args.profile_dir and str(Path(args.profile_dir) / name), args.profiler)
+    profiles = {}
+
+    # The master list and schedule are shared by every attendance workbook, so load them once
+    shared_profiler = new_profiler('shared_inputs')
+    if args.snapshot_dir:
+        master_list_df = shared_profiler.run('create_master_employee_list', SnapshotUtils.load, args.master_list, 'master', args.snapshot_dir)
+        sched_df = shared_profiler.run('create_schedule_dataframe', SnapshotUtils.load, args.schedule, 'schedule', args.snapshot_dir,
+                                       sheet_names=args.schedule_sheets, workers=args.workers, profiler=shared_profiler)
+    else:
+        master_list_df = shared_profiler.run('create_master_employee_list', CleaningUtils.create_master_employee_list, args.master_list)
+        sched_df = shared_profiler.run('create_schedule_dataframe', CleaningUtils.create_schedule_dataframe, args.schedule,
+                                       sheet_names=args.schedule_sheets, workers=args.workers, profiler=shared_profiler)
+    print_profile('Shared inputs', shared_profiler)
+    profiles['shared inputs'] = shared_profiler.records
+
+    for attendance_path, output_name in zip(attendance_paths, output_names):
+        profiler = new_profiler(output_name)
+        if args.store:
+            grouped_df, unparsed_times_df, processed_dates = run_incremental_pipeline(
+                attendance_path, master_list_df, sched_df, args.store, profiler, args.workers, rules)
+            print(f"{attendance_path}: processed {len(processed_dates)} new or changed date(s) {', '.join(processed_dates)}", file=sys.stderr)
+        else:
+            grouped_df, unparsed_times_df = run_pipeline(attendance_path, master_list_df, sched_df, profiler,
+                                                         args.workers, args.shard_by, rules)
+
+        output_path = profiler.run('export', write_output, grouped_df, output_dir / f'{output_name}_cleaned', args.format)
+        if args.rollup:
+            profiler.run('RollupUtils.add_period', RollupUtils.add_period, args.rollup, grouped_df)
+
+        print_profile(f'{attendance_path} -> {output_path} ({len(grouped_df)} rows)', profiler)
+        profiles[str(attendance_path)] = profiler.records
+        if not unparsed_times_df.empty:
+            print(f"  warning: {len(unparsed_times_df)} schedule/attendance time entries could not be parsed", file=sys.stderr)
+
+    if args.profile_json:
+        with open(args.profile_json, 'w', encoding='utf-8') as file:
+            json.dump(profiles, file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
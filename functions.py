@@ -1,20 +1,69 @@
 import pandas as pd
-import plotly.express as px
 import numpy as np
-from datetime import datetime, timedelta
-from PIL import Image
+from datetime import date, datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
 import re 
-import streamlit as st
+import io
+import os
+import hashlib
+import importlib.util
+import tempfile
+import threading
+import time
+import json
+import pickle
+import sys
+import cProfile
+import tracemalloc
+import xlsxwriter
 
 import warnings
 warnings.simplefilter("ignore")
 
 pd.options.mode.chained_assignment = None  # Set pandas option to suppress chained assignment warning
 
-im = Image.open("images/neusoft_logo.png")
+# Read workbooks with the faster calamine backend when it is installed, falling back to openpyxl
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') is not None else 'openpyxl'
 
 class CleaningUtils:
 
+  # Schedule codes that are carried over into the attendance data as ' (CODE)'
+  ATTENDANCE_CODES = frozenset([
+      'TRN', 'HD', 'VL', 'ABSA', 'ABSU', 'NCNS', 'RDOT', 'RTWO', 'ATTRIT', 'SL',
+      'EL', 'BL', 'ML', 'OFF', 'SUSPENDED', 'ABSENT-A', 'HalfDay', 'LATE',
+      'ABSENT', 'ABSENT-U', 'CHANGEOFF', 'FLEXI', 'HOLIDAYOFF',
+      'LEAVE', 'RESIGNED', 'SUPPORT', 'TERMINATED', 'TRANSFERINAECALLS',
+      'TRANSFERTOFE', 'TRANSFERED'
+  ])
+
+  # Scheduled times ("%I:%M%p", e.g. 09:00AM) and actual punches ("%H:%M", e.g. 18:05)
+  SCHEDULE_TIME_PATTERN = r'^(1[0-2]|0[1-9]|[1-9]):([0-5]\d|\d)([AaPp][Mm])$'
+  ACTUAL_TIME_PATTERN = r'^(2[0-3]|[01]\d|\d):([0-5]\d|\d)$'
+
+  # Columns kept from the master list
+  MASTER_LIST_COLUMNS = ['Employee Name', 'Employee Code (ID)' ,'WB Work Number','RAG', 'Work Location', 'Shift', 'Site', 'LOB', 'Leader','Employer']
+
+  # Schedule sheets, one per LOB; configured sheets missing from a workbook are skipped.
+  # IDN and BZ are only read when requested through sheet_names
+  SCHEDULE_SHEETS = ['RBC', 'HSQ', 'ISA']
+
+  @staticmethod
+  def read_workbook_sheets(filepath, sheet_names, usecols=None):
+    """
+    Reads several sheets of an Excel workbook while opening and parsing the file only once.
+
+    Args:
+        filepath (str): Path to (or file-like object of) the Excel workbook.
+        sheet_names (list): Names of the sheets to read.
+        usecols (callable, optional): Column filter passed to pd.read_excel.
+
+    Returns:
+        dict: A DataFrame per sheet name.
+    """
+
+    return pd.read_excel(filepath, sheet_name=list(sheet_names), usecols=usecols, engine=EXCEL_ENGINE)
+
   @staticmethod
   def create_master_employee_list(filepath):
     """
@@ -28,50 +77,120 @@ class CleaningUtils:
         pandas.DataFrame: A DataFrame containing a consolidated list of employees
                           with specified columns.
     """
-    # Read active employee data
-    active_df = pd.read_excel(filepath, sheet_name='Active')
-
-    # Read inactive employee data
-    inactive_df = pd.read_excel(filepath, sheet_name='Inactive')
+    # Read active and inactive employee data in one pass, parsing only the needed columns
+    sheets = CleaningUtils.read_workbook_sheets(filepath, ['Active', 'Inactive'],
+                                                usecols=lambda column: column in CleaningUtils.MASTER_LIST_COLUMNS)
 
     # Combine active and inactive dataframes
-    combined_df = pd.concat([active_df, inactive_df], ignore_index=True)
+    combined_df = pd.concat([sheets['Active'], sheets['Inactive']], ignore_index=True)
 
     # Select desired columns
-    employee_df = combined_df[['Employee Name', 'Employee Code (ID)' ,'WB Work Number','RAG', 'Work Location', 'Shift', 'Site', 'LOB', 'Leader','Employer']]
+    employee_df = combined_df[CleaningUtils.MASTER_LIST_COLUMNS]
 
     return employee_df
 
   @staticmethod
-  def create_schedule_dataframe(filepath):
+  def read_schedule_sheet(filepath, sheet_name):
+    """
+    Reads and times one schedule sheet; runs in the worker processes of create_schedule_dataframe.
+
+    Args:
+        filepath (str or file-like): Path to (or file-like object of) the schedule workbook.
+        sheet_name (str): The sheet to read.
+
+    Returns:
+        tuple: The sheet's DataFrame and its parse time in seconds.
+    """
+
+    start = time.perf_counter()
+    sheet_df = pd.read_excel(filepath, sheet_name=sheet_name, engine=EXCEL_ENGINE)
+
+    return sheet_df, time.perf_counter() - start
+
+  @staticmethod
+  def schedule_sheet_dates(sheet_df, sheet_name):
+    """
+    Reads the date header of a schedule sheet (first row, column offset 6).
+
+    Args:
+        sheet_df (pandas.DataFrame): The sheet as read by pd.read_excel.
+        sheet_name (str): The sheet name, for error messages.
+
+    Returns:
+        list: The dates formatted as '%Y-%m-%d'.
+    """
+
+    header = sheet_df.iloc[0, 6:] if len(sheet_df) else pd.Series(dtype=object)
+    if header.empty or not all(isinstance(value, (datetime, date)) for value in header):
+      raise ValueError(f"Schedule sheet {sheet_name!r} has no date header in its first row")
+
+    return [value.strftime('%Y-%m-%d') for value in header]
+
+  @staticmethod
+  def create_schedule_dataframe(filepath, sheet_names=None, workers=1, profiler=None):
     """
     This function reads an Excel file containing schedule data from multiple sheets
     and returns a consolidated DataFrame with formatted dates as columns.
 
+    Sheets are parsed in a process pool when more than one worker is requested, and every
+    sheet must cover the same dates as the first one.
+
     Args:
         filepath (str): Path to the Excel file containing schedule data.
+        sheet_names (list, optional): Sheets to read; defaults to the SCHEDULE_SHEETS found in the workbook.
+        workers (int): Worker processes, at most one per sheet; 1 parses the sheets serially from
+                       the opened workbook, which is fastest for a few small sheets.
+        profiler (PipelineProfiler, optional): Records the parse time of every sheet.
 
     Returns:
         pandas.DataFrame: A DataFrame containing a consolidated schedule with 
                           formatted dates as columns.
     """
 
-    # Read schedule dates from RBC sheet (assuming first row, column offset 6)
-    schedule_dates = pd.read_excel(filepath, sheet_name='RBC').iloc[0, 6:].tolist()
-    formatted_dates = [date.strftime('%Y-%m-%d') for date in schedule_dates]
+    # Uploaded files are read once and handed to each sheet reader as bytes
+    if hasattr(filepath, 'read'):
+      filepath.seek(0)
+      workbook_bytes = filepath.read()
+      open_workbook = lambda: io.BytesIO(workbook_bytes)
+    else:
+      open_workbook = lambda: filepath
+
+    with pd.ExcelFile(open_workbook(), engine=EXCEL_ENGINE) as workbook:
+      if sheet_names is None:
+        sheet_names = [sheet_name for sheet_name in CleaningUtils.SCHEDULE_SHEETS if sheet_name in workbook.sheet_names]
+        if not sheet_names:
+          raise ValueError(f"The schedule workbook has none of the sheets {', '.join(CleaningUtils.SCHEDULE_SHEETS)}")
+
+      workers = min(workers, len(sheet_names))
+
+      # Parse the sheets concurrently, or one after the other from the already opened workbook
+      if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+          results = list(executor.map(CleaningUtils.read_schedule_sheet, [open_workbook() for _ in sheet_names], sheet_names))
+      else:
+        results = []
+        for sheet_name in sheet_names:
+          start = time.perf_counter()
+          results.append((workbook.parse(sheet_name), time.perf_counter() - start))
+
+    sheets = {sheet_name: sheet_df for sheet_name, (sheet_df, _) in zip(sheet_names, results)}
+    if profiler is not None:
+      for sheet_name, (sheet_df, seconds) in zip(sheet_names, results):
+        profiler.record(f'create_schedule_dataframe: sheet {sheet_name}', seconds, output_rows=len(sheet_df))
+
+    # Every sheet must share the date header of the first one, as the columns are concatenated by position
+    formatted_dates = CleaningUtils.schedule_sheet_dates(sheets[sheet_names[0]], sheet_names[0])
+    for sheet_name in sheet_names[1:]:
+      if CleaningUtils.schedule_sheet_dates(sheets[sheet_name], sheet_name) != formatted_dates:
+        raise ValueError(f"Schedule sheet {sheet_name!r} covers different dates than sheet {sheet_names[0]!r}")
 
     # Define column names including employee information and formatted dates
     columns = ['Index', 'Employee Number', 'LOB', 'EmployeeID', 'Work Number', 'Name']
     columns.extend(formatted_dates)
 
-    # Read data from each sheet (assuming data starts from row 3)
-    rbc_df = pd.read_excel(filepath, sheet_name='RBC')[3:]
-    hsq_df = pd.read_excel(filepath, sheet_name='HSQ')[3:]
-    # idn_df = pd.read_excel(filepath, sheet_name='IDN')[3:]
-    isa_df = pd.read_excel(filepath, sheet_name='ISA')[3:]
-    # bz_df = pd.read_excel(filepath, sheet_name='BZ')[3:]
+    # Take the data of each sheet (assuming data starts from row 3)
     # Concatenate dataframes and set column names
-    df = pd.concat([rbc_df, hsq_df, isa_df], ignore_index=True)
+    df = pd.concat([sheets[sheet_name][3:] for sheet_name in sheet_names], ignore_index=True)
     df.columns = columns
 
     # Remove whitespaces from schedule date columns
@@ -95,7 +214,7 @@ class CleaningUtils:
     """
 
     # Read attendance data from the Excel file
-    attendance_df = pd.read_excel(filepath, sheet_name='打卡时间')
+    attendance_df = pd.read_excel(filepath, sheet_name='打卡时间', engine=EXCEL_ENGINE)
 
     # Extract dates from the first column using regular expressions
     date_strings = re.findall(r'\d{4}-\d{2}-\d{2}', attendance_df.columns[0])
@@ -117,7 +236,24 @@ class CleaningUtils:
     sliced_df.columns = columns
 
     return sliced_df, date_list
-  
+
+  @staticmethod
+  def normalize_work_numbers(work_numbers):
+    """
+    Normalizes raw work numbers into the 'WB<digits>' format used by the master list.
+
+    Args:
+        work_numbers (pd.Series): Raw work number values (strings, numbers or NaN).
+
+    Returns:
+        pd.Series: Work numbers made of 'WB' followed by every digit found in the raw value.
+    """
+
+    # Keep only the digits of the string form of each value (NaN becomes 'nan' -> '')
+    digits = work_numbers.astype(str).str.replace(r'\D+', '', regex=True)
+
+    return 'WB' + digits
+
   @staticmethod
   def incorporate_master_data(cleaned_df, master_list, date_list):
     """
@@ -131,63 +267,37 @@ class CleaningUtils:
         pd.DataFrame: The enhanced DataFrame with merged employee data.
     """
 
-    # Initialize lists to store data for new columns
-    employee_names = []  # Clearer variable name
-    employee_ids = []
-    work_numbers = []  # Consistent naming convention
-    rags = []
-    work_locations = []
-    lobs = []  # Abbreviation for Line of Business
-    sites = []
-    shifts = []
-    managers = []  # More descriptive name
-    employers = []
-
-    # Iterate through each row in the cleaned dataframe
-    for index, row in cleaned_df.iterrows():
-        extracted_digits = re.findall(r'\d+', str(row.get('WB Work Number', '')))
-        digits = ''.join(extracted_digits)
-        work_number = 'WB' + digits  # Store for clarity
-
-        # Check for matching work number in the master list
-        matching_record = master_list.loc[master_list['WB Work Number'] == work_number]
-
-        if not matching_record.empty:
-            # Extract data from the matching master record
-            employee_names.append(matching_record.iloc[0]['Employee Name'])
-            employee_ids.append(matching_record.iloc[0]['Employee Code (ID)'])
-            work_numbers.append(work_number)  # Reuse stored value
-            rags.append(matching_record.iloc[0]['RAG'])
-            work_locations.append(matching_record.iloc[0]['Work Location'])
-            lobs.append(matching_record.iloc[0]['LOB'])
-            sites.append(matching_record.iloc[0]['Site'])
-            shifts.append(matching_record.iloc[0]['Shift'])
-            managers.append(matching_record.iloc[0]['Leader'])
-            employers.append(matching_record.iloc[0]['Employer'])
-        else:
-            # Handle missing matches
-            employee_names.append(row.get('Employee Name'))  # Use 'Name' if available
-            employee_ids.append(np.nan)
-            work_numbers.append(work_number)
-            rags.append(np.nan)
-            work_locations.append(np.nan)
-            lobs.append(np.nan)
-            sites.append(np.nan)
-            shifts.append(np.nan)
-            managers.append(np.nan)
-            employers.append(np.nan)
+    # Normalize every work number in one pass (e.g. 'wb 123' -> 'WB123')
+    if 'WB Work Number' in cleaned_df.columns:
+      work_numbers = CleaningUtils.normalize_work_numbers(cleaned_df['WB Work Number'])
+    else:
+      work_numbers = pd.Series('WB', index=cleaned_df.index)
+
+    # Index the master list by work number once; the first record wins on duplicates
+    master_index = master_list.drop_duplicates(subset='WB Work Number', keep='first').set_index('WB Work Number')
+
+    # Single keyed lookup for all attendance rows
+    matching_records = master_index.reindex(work_numbers.values)
+    matching_records.index = cleaned_df.index
+    is_matched = work_numbers.isin(master_index.index).values
+
+    # Fall back to the attendance name when there is no matching master record
+    if 'Employee Name' in cleaned_df.columns:
+      fallback_names = cleaned_df['Employee Name']
+    else:
+      fallback_names = pd.Series(None, index=cleaned_df.index, dtype=object)
 
     # Add new columns to the cleaned dataframe
-    cleaned_df['Employee Name'] = employee_names
-    cleaned_df['EmployeeID'] = employee_ids
-    cleaned_df['WB Work Number'] = work_numbers  # Renamed for consistency
-    cleaned_df['RAG'] = rags
-    cleaned_df['Work Location'] = work_locations
-    cleaned_df['LOB'] = lobs
-    cleaned_df['Site'] = sites
-    cleaned_df['Shift'] = shifts
-    cleaned_df['Manager'] = managers
-    cleaned_df['Employer'] = employers
+    cleaned_df['Employee Name'] = matching_records['Employee Name'].where(is_matched, fallback_names)
+    cleaned_df['EmployeeID'] = matching_records['Employee Code (ID)']
+    cleaned_df['WB Work Number'] = work_numbers
+    cleaned_df['RAG'] = matching_records['RAG']
+    cleaned_df['Work Location'] = matching_records['Work Location']
+    cleaned_df['LOB'] = matching_records['LOB']
+    cleaned_df['Site'] = matching_records['Site']
+    cleaned_df['Shift'] = matching_records['Shift']
+    cleaned_df['Manager'] = matching_records['Leader']
+    cleaned_df['Employer'] = matching_records['Employer']
 
     # Rearrange columns for clarity
     new_column_order = ['Employee Name', 'EmployeeID', 'WB Work Number', 'RAG', 'Work Location',
@@ -196,13 +306,14 @@ class CleaningUtils:
     return cleaned_df[new_column_order]
 
   @staticmethod
-  def update_attendance_codes(merged_df, schedule_df):
+  def update_attendance_codes(merged_df, schedule_df, rules=None):
     """
     Updates attendance codes in the merged dataframe based on the schedule data.
 
     Args:
         merged_df (pd.DataFrame): The DataFrame containing merged employee and attendance data.
         schedule_df (pd.DataFrame): The DataFrame containing employee schedule information.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
 
     Returns:
         pd.DataFrame: The updated DataFrame with attendance codes potentially including schedule codes.
@@ -211,150 +322,351 @@ class CleaningUtils:
     # Get a list of columns containing attendance dates
     attendance_date_columns = list(merged_df.columns)[10:]
 
-    # Define a list of possible attendance codes
-    attendance_codes = [
-        'TRN', 'HD', 'VL', 'ABSA', 'ABSU', 'NCNS', 'RDOT', 'RTWO', 'ATTRIT', 'SL', 
-        'EL', 'BL', 'ML', 'OFF', 'SUSPENDED', 'ABSENT-A', 'HalfDay', 'LATE', 
-        'ABSENT', 'ABSENT-U', 'ATTRIT', 'CHANGEOFF', 'FLEXI', 'HOLIDAYOFF', 
-        'LEAVE', 'RESIGNED', 'SUPPORT', 'TERMINATED', 'TRANSFERINAECALLS', 
-        'TRANSFERTOFE', 'TRANSFERED'
-    ]
+    # Align the schedule with the attendance data on work number once
+    scheduled = schedule_df.loc[schedule_df['Work Number'].isin(merged_df['WB Work Number'].values)]
+    schedule_values = scheduled[attendance_date_columns]
+
+    # Employee x date mask of the valid schedule codes
+    attendance_codes = CleaningUtils.ATTENDANCE_CODES if rules is None else rules.attendance_codes
+    code_mask = schedule_values.isin(attendance_codes).to_numpy()
+    if not code_mask.any():
+      return merged_df
+
+    # Build one ' (CODE)' suffix per employee and date, keeping the schedule row order
+    row_positions, column_positions = np.nonzero(code_mask)
+    suffixes = pd.DataFrame({
+        'WB Work Number': scheduled['Work Number'].to_numpy()[row_positions],
+        'Date': np.array(attendance_date_columns, dtype=object)[column_positions],
+        'Suffix': ' (' + schedule_values.to_numpy(dtype=object)[row_positions, column_positions] + ')'
+    })
+    suffixes = suffixes.groupby(['WB Work Number', 'Date'], sort=False)['Suffix'].sum().unstack()
 
-    
-    # Iterate through rows in the schedule dataframe
-    for index, row in schedule_df.iterrows():
-      wb_work_number = row['Work Number']
-      # Check if employee ID exists in the merged dataframe
-      if wb_work_number in merged_df['WB Work Number'].values:
-        for date_column in attendance_date_columns:
-          # Check if schedule code exists for the date
-          if row[date_column] in attendance_codes:
-            # Get existing attendance value for the employee and date
-            existing_value = merged_df.loc[(merged_df['WB Work Number'] == wb_work_number), date_column].values[0]
-            # Combine existing value with schedule code in parentheses
-            updated_value = f"{existing_value} ({row[date_column]})"
-            # Update the attendance code in the merged dataframe
-            merged_df.loc[(merged_df['WB Work Number'] == wb_work_number), date_column] = updated_value
-    return merged_df
-
-
-  # Function to clean time data in a row (helper function)
-  @staticmethod
-  def clean_time(row):
-      # Apply the cleaning operation to each relevant column in the row
-      for col in row.index:
-          x = row[col]
-          # Ensure x is a string for string operations
-          if isinstance(x, str):
-              # Attempting to replace "外勤" with an empty string if present and strip whitespace
-              x = x.replace("外勤", "").strip()
-
-              # Split the string by newline and extract the first and last times after sorting them
-              times = x.split('\n')
-
-              # Checking the conditions and updating x accordingly
-              if x.count("\n") > 1 and ":" in x:
-                  row[col] = f"{times[0]} - {times[-1]} (MUL)"
-              elif x.count("\n") == 1 and x.count(":") == 2:
-                  row[col] = f"{times[0]} - {times[-1]}"
-
-              elif x.count(":") == 1:
-                  row[col] = f"{x} (MIS)"
-
-              else:
-                  # If there's only one time, or no valid time, mark as missing
-                  row[col] = x
-          else:
-              # If x is NaN or not a string, it cannot be cleaned with string methods
-              if pd.isna(x):
-                  row[col] = np.nan
-      return row
-
-  @staticmethod
-  def analyze_attendance_time_differences(scheduled_in_time_str, scheduled_out_time_str, actual_in_time_str, actual_out_time_str):
+    # Combine the existing attendance values (first record per work number) with the suffixes
+    existing_values = merged_df.drop_duplicates(subset='WB Work Number', keep='first').set_index('WB Work Number')
+    existing_values = existing_values.loc[suffixes.index, suffixes.columns].astype(str)
+
+    # Write every updated cell back in one bulk operation
+    return CleaningUtils.write_by_work_number(merged_df, existing_values + suffixes)
+
+  @staticmethod
+  def write_by_work_number(dataframe, updates):
+    """
+    Writes wide per-employee updates into every row sharing the same work number.
+
+    Args:
+        dataframe (pd.DataFrame): DataFrame with a 'WB Work Number' column and date columns.
+        updates (pd.DataFrame): New values indexed by work number with date columns;
+                                missing values leave the existing cell untouched.
+
+    Returns:
+        pd.DataFrame: The updated DataFrame.
+    """
+
+    # Expand the updates to the rows of the dataframe
+    aligned_updates = updates.reindex(dataframe['WB Work Number'].values)
+    aligned_updates.index = dataframe.index
+
+    columns = list(updates.columns)
+    dataframe[columns] = dataframe[columns].mask(aligned_updates.notna(), aligned_updates)
+
+    return dataframe
+
+
+  @staticmethod
+  def clean_time_data(attendance_dataframe):
+    """
+    Cleans the punch strings of every attendance date column in one pass.
+
+    Each cell is stripped of "外勤" markers and whitespace and reduced to 'HH:MM-HH:MM'
+    for an in/out pair, 'HH:MM-HH:MM(MUL)' for multiple punches or 'HH:MM(MIS)' for
+    a single punch. Cells that are not strings become NaN.
+
+    Args:
+        attendance_dataframe (pd.DataFrame): DataFrame with raw punch strings in the date columns.
+
+    Returns:
+        pd.DataFrame: The DataFrame with cleaned punch strings.
+    """
+
+    attendance_date_columns = list(attendance_dataframe.columns)[10:]
+
+    # Stack the date columns into one long column of raw punch strings
+    punches = pd.Series(attendance_dataframe[attendance_date_columns].to_numpy(dtype=object).ravel())
+    punches = punches.str.replace("外勤", "", regex=False).str.strip()
+
+    # Count the line breaks and colons of every cell at once
+    line_breaks = punches.str.count('\n')
+    colons = punches.str.count(':')
+
+    # First and last punch of each cell
+    times = punches.str.split('\n')
+    first_and_last = times.str[0] + ' - ' + times.str[-1]
+
+    # Classify each cell as multiple punches, an in/out pair or a single (missed) punch
+    cleaned = np.select(
+        [(line_breaks > 1) & (colons > 0), (line_breaks == 1) & (colons == 2), colons == 1],
+        [first_and_last + ' (MUL)', first_and_last, punches + ' (MIS)'],
+        default=punches
+    )
+    cleaned = pd.Series(cleaned, dtype=object).str.replace(r'\s+', '', regex=True)
+    cleaned = cleaned.where(cleaned.notna(), np.nan)
+
+    # Write all date columns back in one assignment
+    attendance_dataframe[attendance_date_columns] = pd.DataFrame(
+        cleaned.to_numpy().reshape(len(attendance_dataframe), len(attendance_date_columns)),
+        index=attendance_dataframe.index, columns=attendance_date_columns)
+
+    return attendance_dataframe
+
+  @staticmethod
+  def parse_time_minutes(time_strings, twelve_hour=False):
+      """
+      Parses time strings into minutes since midnight in one vectorized pass.
+
+      Args:
+          time_strings (pd.Series): Times formatted as "%I:%M%p" (twelve_hour) or "%H:%M".
+          twelve_hour (bool): Whether the times carry an AM/PM suffix.
+
+      Returns:
+          numpy.ndarray: Minutes since midnight as floats, NaN where a time cannot be parsed.
+      """
+      pattern = CleaningUtils.SCHEDULE_TIME_PATTERN if twelve_hour else CleaningUtils.ACTUAL_TIME_PATTERN
+      parts = pd.Series(time_strings, dtype=object).str.extract(pattern)
+
+      hours = pd.to_numeric(parts[0]).to_numpy(dtype=float)
+      minutes = pd.to_numeric(parts[1]).to_numpy(dtype=float)
+
+      if twelve_hour:
+          # 12AM is midnight and 12PM is noon
+          is_pm = parts[2].str.upper().eq('PM').to_numpy()
+          hours = hours % 12 + np.where(is_pm, 12, 0)
+
+      return hours * 60 + minutes
+
+  @staticmethod
+  def classify_attendance_times(scheduled_in_times, scheduled_out_times, actual_in_times, actual_out_times, limits=None):
+      """
+      Generates attendance status codes for whole columns of scheduled and actual times.
+
+      Args:
+          scheduled_in_times (pd.Series): Scheduled start times ("%I:%M%p").
+          scheduled_out_times (pd.Series): Scheduled end times ("%I:%M%p").
+          actual_in_times (pd.Series): Actual check-in times ("%H:%M").
+          actual_out_times (pd.Series): Actual check-out times ("%H:%M").
+          limits (dict, optional): Late/overtime limits per entry, see flag_late_and_overtime.
+
+      Returns:
+          tuple: A numpy array of codes ('(L)', '(OT)', '(L) (OT)' or '') and a boolean
+                 numpy array marking the entries whose times could all be parsed.
+      """
+      scheduled_in = CleaningUtils.parse_time_minutes(scheduled_in_times, twelve_hour=True)
+      scheduled_out = CleaningUtils.parse_time_minutes(scheduled_out_times, twelve_hour=True)
+      actual_in = CleaningUtils.parse_time_minutes(actual_in_times)
+      actual_out = CleaningUtils.parse_time_minutes(actual_out_times)
+
+      is_parsed = ~np.isnan(scheduled_in + scheduled_out + actual_in + actual_out)
+
+      is_late, is_overtime = CleaningUtils.flag_late_and_overtime(scheduled_in, scheduled_out, actual_in, actual_out, limits)
+
+      codes = np.select([is_late & is_overtime, is_late, is_overtime], ['(L) (OT)', '(L)', '(OT)'], default='')
+
+      return np.where(is_parsed, codes, ''), is_parsed
+
+  @staticmethod
+  def flag_late_and_overtime(scheduled_in, scheduled_out, actual_in, actual_out, limits=None):
+      """
+      Flags late and overtime entries from scheduled and actual times in minutes since midnight.
+
+      For overnight shifts, differences are wrapped into a +/- 12 hour window so that shifts
+      crossing midnight compare the right days.
+
+      Args:
+          scheduled_in (numpy.ndarray): Scheduled start minutes.
+          scheduled_out (numpy.ndarray): Scheduled end minutes.
+          actual_in (numpy.ndarray): Actual check-in minutes.
+          actual_out (numpy.ndarray): Actual check-out minutes.
+          limits (dict, optional): Limits from AttendanceRules.policy_limits, one value per entry or
+                                   one for all; AttendanceRules.DEFAULT_POLICY if omitted.
+
+      Returns:
+          tuple: Boolean numpy arrays marking the late and the overtime entries.
+      """
+      limits = AttendanceRules.DEFAULT_POLICY if limits is None else limits
+
+      check_in_difference = actual_in - scheduled_in
+      check_out_difference = actual_out - scheduled_out
+      wrap_overnight = lambda difference: np.where(limits['overnight_shifts'], (difference + 720) % 1440 - 720, difference)
+      check_in_difference = wrap_overnight(check_in_difference)
+      check_out_difference = wrap_overnight(check_out_difference)
+
+      is_late = (check_in_difference > limits['late_grace_minutes']) | (check_out_difference < -limits['early_out_grace_minutes'])
+
+      # Overtime minutes are rounded down to whole blocks before they are compared with the threshold
+      rounding = limits['overtime_rounding_minutes']
+      overtime_minutes = lambda difference: np.floor(np.maximum(difference, 0) / rounding) * rounding
+      is_overtime = ((limits['early_in_overtime'] & (overtime_minutes(-check_in_difference) >= limits['overtime_threshold_minutes']))
+                     | (overtime_minutes(check_out_difference) >= limits['overtime_threshold_minutes']))
+
+      return is_late, is_overtime
+
+  @staticmethod
+  def analyze_attendance_time_differences(scheduled_in_time_str, scheduled_out_time_str, actual_in_time_str, actual_out_time_str, limits=None):
       """
       Analyzes time differences between scheduled and actual attendance times,
       generating attendance status codes.
       """
-      try:
-          scheduled_in_time = datetime.strptime(scheduled_in_time_str, "%I:%M%p")
-          scheduled_out_time = datetime.strptime(scheduled_out_time_str, "%I:%M%p")
-          actual_in_time = datetime.strptime(actual_in_time_str, "%H:%M")
-          actual_out_time = datetime.strptime(actual_out_time_str, "%H:%M")
-      except ValueError as e:
-          st.warning(f"Error parsing times - scheduled_in: {scheduled_in_time_str}, scheduled_out: {scheduled_out_time_str}, actual_in: {actual_in_time_str}, actual_out: {actual_out_time_str}")
-          raise e
-  
-      calculate_time_difference = lambda actual, scheduled: (actual - scheduled).total_seconds() / 60
-  
-      attendance_codes = []
-  
-      check_in_difference = calculate_time_difference(actual_in_time, scheduled_in_time)
-      if check_in_difference <= -16:
-          attendance_codes.append("(OT)")
-      elif check_in_difference >= 1:
-          attendance_codes.append("(L)")
-  
-      check_out_difference = calculate_time_difference(actual_out_time, scheduled_out_time)
-      if check_out_difference >= 16:
-          attendance_codes.append("(OT)")
-      elif check_out_difference <= -1:
-          attendance_codes.append("(L)")
-  
-      return list(np.unique(attendance_codes))
+      codes, is_parsed = CleaningUtils.classify_attendance_times(
+          [scheduled_in_time_str], [scheduled_out_time_str], [actual_in_time_str], [actual_out_time_str], limits)
+
+      if not is_parsed[0]:
+          raise ValueError(f"Error parsing times - scheduled_in: {scheduled_in_time_str}, scheduled_out: {scheduled_out_time_str}, actual_in: {actual_in_time_str}, actual_out: {actual_out_time_str}")
+
+      return codes[0].split()
 
   @staticmethod
-  def merge_final_attendance_codes(self, dataframe_with_codes, schedule_dataframe):
+  def merge_final_attendance_codes(self, dataframe_with_codes, schedule_dataframe, rules=None):
     """
     Incorporates final attendance codes based on schedule information.
 
     Args:
         dataframe_with_codes (pd.DataFrame): DataFrame with existing attendance codes.
         schedule_dataframe (pd.DataFrame): DataFrame containing schedule data.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
 
     Returns:
-        pd.DataFrame: DataFrame with final attendance codes applied.
+        tuple: The DataFrame with final attendance codes applied and a DataFrame reporting
+               the schedule/attendance cells whose times could not be parsed (left unchanged).
     """
 
     attendance_date_columns = list(dataframe_with_codes.columns)[10:]
+    unparsed_cells = []
+    rules = AttendanceRules() if rules is None else rules
+
+    # Align the schedule with the attendance data on work number
+    scheduled = schedule_dataframe.loc[schedule_dataframe['Work Number'].isin(dataframe_with_codes['WB Work Number'].values)]
+
+    # Employees listed more than once in the schedule are coded once per listing, in order
+    for _, schedule_pass in scheduled.groupby(scheduled.groupby('Work Number').cumcount(), sort=True):
+      work_numbers = schedule_pass['Work Number'].to_numpy()
+      current_values = dataframe_with_codes.drop_duplicates(subset='WB Work Number', keep='first').set_index('WB Work Number')
+
+      # Flatten the employee x date cells of both frames into aligned columns
+      schedule_values = pd.Series(schedule_pass[attendance_date_columns].to_numpy(dtype=object).ravel())
+      attendance_values = pd.Series(current_values.loc[work_numbers, attendance_date_columns].to_numpy(dtype=object).ravel())
+
+      is_scheduled = schedule_values.str.len().notna()
+      has_attendance = attendance_values.str.len().notna()
+
+      # Mark as absent if scheduled but no attendance
+      is_absent = attendance_values.isna() & is_scheduled
+
+      # Apply attendance time-based codes where both cells hold a time range
+      is_timed = is_scheduled & has_attendance & schedule_values.str.count(':').eq(2) & attendance_values.str.count(':').eq(2)
+
+      timed_schedule = schedule_values[is_timed]
+      timed_attendance = attendance_values[is_timed]
+      employee_limits = rules.policy_limits(current_values.loc[work_numbers, 'LOB'], current_values.loc[work_numbers, 'Site'])
+      codes, is_parsed = CleaningUtils.classify_attendance_times(
+          timed_schedule.str[0:7], timed_schedule.str[8:15], timed_attendance.str[0:5], timed_attendance.str[6:11],
+          AttendanceRules.take_limits(employee_limits, timed_attendance.index.to_numpy() // len(attendance_date_columns)))
+
+      new_values = pd.Series(np.nan, index=attendance_values.index, dtype=object)
+      new_values[is_absent] = attendance_values[is_absent].astype(str) + ' (ABSENT)'
+      new_values[timed_attendance.index[is_parsed]] = np.where(
+          codes[is_parsed] == '', timed_attendance[is_parsed], timed_attendance[is_parsed] + ' ' + codes[is_parsed])
+
+      # Collect the cells whose times failed to parse into one report
+      unparsed_positions = timed_attendance.index[~is_parsed].to_numpy()
+      if len(unparsed_positions):
+        unparsed_cells.append(pd.DataFrame({
+            'WB Work Number': work_numbers[unparsed_positions // len(attendance_date_columns)],
+            'Date': np.array(attendance_date_columns, dtype=object)[unparsed_positions % len(attendance_date_columns)],
+            'Schedule': schedule_values[unparsed_positions].to_numpy(),
+            'Attendance': attendance_values[unparsed_positions].to_numpy()
+        }))
+
+      updates = pd.DataFrame(new_values.to_numpy().reshape(len(work_numbers), len(attendance_date_columns)),
+                             index=work_numbers, columns=attendance_date_columns)
+      CleaningUtils.write_by_work_number(dataframe_with_codes, updates)
+
+    unparsed_df = pd.concat(unparsed_cells, ignore_index=True) if unparsed_cells else pd.DataFrame(columns=['WB Work Number', 'Date', 'Schedule', 'Attendance'])
+    unparsed_df = unparsed_df.drop_duplicates().sort_values(by=['WB Work Number', 'Date'], kind='stable', ignore_index=True)
+
+    return dataframe_with_codes, unparsed_df
+
+  @staticmethod
+  def split_attendance_cells(cells):
+    """
+    Splits coded wide cells such as '09:01-18:00(MUL)' into Time In, Time Out and Remarks.
 
-    for index, schedule_row in schedule_dataframe.iterrows():
-      employee_work_number = schedule_row['Work Number']
+    Args:
+        cells (numpy.ndarray): Flat object array of coded cells.
+
+    Returns:
+        tuple: Object numpy arrays of Time In, Time Out and Remarks (None when missing).
+    """
 
-      if employee_work_number in dataframe_with_codes['WB Work Number'].values:
-        for date_column in attendance_date_columns:
-          schedule_value = schedule_row[date_column]
-          attendance_value = dataframe_with_codes.loc[dataframe_with_codes['WB Work Number'] == employee_work_number, date_column].values[0]
+    # Regular expression to match time and remarks in parentheses (anchored like re.match),
+    # remarks may follow the times after a space, as in '09:25-18:09 (L)'
+    time_pattern = re.compile(r'^(\d{2}:\d{2})(-(\d{2}:\d{2}))?\s*(\(.*\))?')
 
-          # Check for absence based on schedule
-          if pd.isnull(attendance_value) and not pd.isnull(schedule_value) and isinstance(schedule_value, str):
-            # Mark as absent if scheduled but no attendance
-            new_value = f"{attendance_value} (ABSENT)" if pd.isnull(attendance_value) else attendance_value
-            dataframe_with_codes.loc[dataframe_with_codes['WB Work Number'] == employee_work_number, date_column] = new_value
+    cells = pd.Series(cells, dtype=object)
 
-          # Apply attendance time-based codes
-          elif isinstance(schedule_value, str) and isinstance(attendance_value, str) and schedule_value.count(":") == 2 and attendance_value.count(":") == 2:
-            
-            # Extract time information from strings
-            scheduled_in_time_str = schedule_value[0:7]
-            scheduled_out_time_str = schedule_value[8:15]
-            actual_in_time_str = attendance_value[0:5]
-            actual_out_time_str = attendance_value[6:11]
+    # Extract Time In / Time Out / Remarks from every non-missing cell at once
+    has_value = cells.notna()
+    time_strings = cells[has_value].astype(str).str.strip()
+    time_parts = time_strings.str.extract(time_pattern)
+    is_match = time_parts[0].notna()
+
+    in_times = pd.Series(None, index=cells.index, dtype=object)
+    out_times = pd.Series(None, index=cells.index, dtype=object)
+    comments = pd.Series(None, index=cells.index, dtype=object)
+    in_times[has_value] = time_parts[0]
+    out_times[has_value] = time_parts[2]
+    # If format doesn't match, consider entire string as a comment
+    comments[has_value] = time_parts[3].where(is_match, time_strings)
+
+    return (in_times.where(in_times.notna(), None).to_numpy(),
+            out_times.where(out_times.notna(), None).to_numpy(),
+            comments.where(comments.notna(), None).to_numpy())
+
+  @staticmethod
+  def build_long_frame(employee_dataframe, date_columns, in_times, out_times, remarks):
+    """
+    Assembles the long-format attendance DataFrame, one row per employee and date, employee by employee.
 
-            # Analyze time differences and retrieve codes
-            applicable_codes = self.analyze_attendance_time_differences(scheduled_in_time_str, scheduled_out_time_str, actual_in_time_str, actual_out_time_str)
+    Args:
+        employee_dataframe (pd.DataFrame): DataFrame with the employee detail columns, one row per employee.
+        date_columns (list): Attendance dates ('%Y-%m-%d').
+        in_times (numpy.ndarray): Time In per cell, employee by employee.
+        out_times (numpy.ndarray): Time Out per cell.
+        remarks (numpy.ndarray): Remarks per cell.
 
-            
-            # Update value with applicable codes
-            if applicable_codes:
-              codes_string = ' '.join(applicable_codes)
-              new_value = f"{attendance_value} {codes_string}"
-            else:
-              new_value = attendance_value  # Keep existing value if no codes
+    Returns:
+        pd.DataFrame: DataFrame with transformed and structured attendance information.
+    """
 
-            dataframe_with_codes.loc[dataframe_with_codes['WB Work Number'] == employee_work_number, date_column] = new_value
+    attendance_dates = [pd.to_datetime(date).date() for date in date_columns]
+    employee_positions = np.repeat(np.arange(len(employee_dataframe)), len(date_columns))
+
+    take_employee_column = lambda column: employee_dataframe[column].to_numpy()[employee_positions]
+
+    formatted_dataframe = pd.DataFrame({
+        'Date': np.tile(np.array(attendance_dates, dtype=object), len(employee_dataframe)),
+        'Employee Name': take_employee_column('Employee Name'),
+        'Employee ID': take_employee_column('EmployeeID'),
+        'WB Work Number': take_employee_column('WB Work Number'),
+        # Low-cardinality columns are stored as categoricals to cut memory
+        'LOB': pd.Categorical(take_employee_column('LOB')),
+        'Site': pd.Categorical(take_employee_column('Site')),
+        'Shift': pd.Categorical(take_employee_column('Shift')),
+        'Manager': pd.Categorical(take_employee_column('Manager')),
+        'Time In': in_times,
+        'Time Out': out_times,
+        'Remarks': remarks
+    })
 
-    return dataframe_with_codes
+    return formatted_dataframe
 
   @staticmethod
   def transform_attendance_data(attendance_dataframe):
@@ -369,204 +681,2016 @@ class CleaningUtils:
         pd.DataFrame: DataFrame with transformed and structured attendance information.
     """
 
-    # Prepare a list to hold the formatted data
-    formatted_records = []
+    # Extract a list of dates from column names (excluding the employee detail columns)
+    date_columns = list(attendance_dataframe.columns[10:])
 
-    # Regular expression to match time and remarks in parentheses
-    time_pattern = re.compile(r'(\d{2}:\d{2})(-(\d{2}:\d{2}))?(\(.*\))?')
+    # Go wide -> long in one step: one cell per employee and date, employee by employee
+    cells = attendance_dataframe[date_columns].to_numpy(dtype=object).ravel()
 
-    # Extract a list of dates from column names (excluding the last two columns)
-    date_columns = attendance_dataframe.columns[10:]
-    attendance_dates = [pd.to_datetime(date).date() for date in date_columns]
-
-    # Iterate through each row in the DataFrame
-    for index, data_row in attendance_dataframe.iterrows():
-      # Extract employee details
-      employee_name = data_row['Employee Name']
-      employee_id = data_row['EmployeeID']
-      work_number = data_row['WB Work Number']
-      lob = data_row['LOB']
-      employee_site = data_row['Site']
-      employee_shift = data_row['Shift']
-      team_leader = data_row['Manager']
-
-      # Iterate over each date to construct individual records
-      for attendance_date in attendance_dates:
-        # Initialize placeholders for time and remarks
-        in_time, out_time, comments = None, None, None
-
-        # Extract time data from the current date's cell
-        time_data = data_row[str(attendance_date)]
-
-        # Process time data if it's not missing
-        if pd.notna(time_data):
-          time_string = str(time_data).strip()
-          match = time_pattern.match(time_string)
-          if match:
-            in_time = match.group(1)
-            out_time = match.group(3) if match.group(3) else None
-            comments = match.group(4) if match.group(4) else None
-          else:
-            # If format doesn't match, consider entire string as a comment
-            comments = time_string
-
-        # Append the structured data to the formatted records list
-        formatted_records.append({
-            'Date': attendance_date,
-            'Employee Name': employee_name,
-            'Employee ID': employee_id,
-            'WB Work Number': work_number,
-            'LOB': lob,
-            'Site': employee_site,
-            'Shift': employee_shift,
-            'Manager': team_leader,
-            'Time In': in_time,
-            'Time Out': out_time,
-            'Remarks': comments
-        })
-
-    # Convert the formatted records list into a DataFrame
-    formatted_dataframe = pd.DataFrame(formatted_records)
-
-    return formatted_dataframe
+    return CleaningUtils.build_long_frame(attendance_dataframe, date_columns, *CleaningUtils.split_attendance_cells(cells))
 
-class AnalysisUtils:
   @staticmethod
-  def metric_count(data_frame):
-    """Counts the occurrences of specific codes in the 'Remarks' column of a DataFrame.
+  def encode_attendance_matrix(merged_df, schedule_df, rules=None):
+    """
+    Codes merged attendance data into a typed AttendanceMatrix, parsing every punch and
+    schedule cell once.
+
+    The codes match update_attendance_codes, clean_time_data and merge_final_attendance_codes.
+    Employees outside the typed model (work numbers listed twice, punch cells that are not
+    plain 'HH:MM' lines, schedule times that cannot be parsed) are coded by those string
+    stages instead and kept as text.
 
     Args:
-        data_frame (pandas.DataFrame): The DataFrame containing manager and code information.
+        merged_df (pd.DataFrame): Output of incorporate_master_data.
+        schedule_df (pd.DataFrame): DataFrame containing employee schedule information.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
 
     Returns:
-        tuple: A tuple containing the counts of 'MIS', 'MUL', 'ABSENT', and 'L' code occurrences.
+        tuple: The AttendanceMatrix and the DataFrame of unparsed time entries.
     """
 
-    missing_information_count = data_frame['Remarks'].str.contains('(MIS)', case=False).sum()
-    multiple_occurrence_count = data_frame['Remarks'].str.contains('(MUL)', case=False).sum()
-    absent_count = data_frame['Remarks'].str.contains('(ABSENT)', case=False).sum()
-    late_count = data_frame['Remarks'].str.contains('(L)', case=False).sum()
+    rules = AttendanceRules() if rules is None else rules
+    date_columns = list(merged_df.columns)[10:]
+    shape = (len(merged_df), len(date_columns))
+    work_numbers = merged_df['WB Work Number'].to_numpy()
+
+    # Raw punch cells, with '外勤' markers and surrounding whitespace dropped as in clean_time_data
+    raw_cells = merged_df[date_columns].to_numpy(dtype=object).ravel()
+    punches = pd.Series(raw_cells, dtype=object).str.replace("外勤", "", regex=False).str.strip()
+
+    first_punch = CleaningUtils.parse_time_minutes(punches.str[:5])
+    last_punch = CleaningUtils.parse_time_minutes(punches.str[-5:])
+    is_punch_list = punches.str.fullmatch(AttendanceMatrix.PUNCH_LIST_PATTERN, na=False).to_numpy(dtype=bool)
+    is_punch_list &= ~np.isnan(first_punch) & ~np.isnan(last_punch)
+    punch_counts = np.where(is_punch_list, punches.str.count('\n').fillna(-1).to_numpy() + 1, 0)
+
+    is_fallback = ~(pd.isna(raw_cells) | is_punch_list).reshape(shape).all(axis=1)
+    is_fallback |= pd.Series(work_numbers).duplicated(keep=False).to_numpy()
+
+    # Align the schedule on work number; employees listed more than once fall back
+    scheduled = schedule_df.loc[schedule_df['Work Number'].isin(work_numbers)]
+    is_fallback |= np.isin(work_numbers, scheduled.loc[scheduled['Work Number'].duplicated(), 'Work Number'].to_numpy())
+    schedule_cells = scheduled.drop_duplicates(subset='Work Number').set_index('Work Number')[date_columns].reindex(work_numbers)
+
+    # Classify each distinct schedule value once; key -1 (no schedule) takes the last entry
+    schedule_keys, schedule_values = pd.factorize(schedule_cells.to_numpy(dtype=object).ravel())
+    schedule_values = pd.Series(list(schedule_values) + [np.nan], dtype=object)
+
+    is_scheduled = schedule_values.str.len().notna().to_numpy()
+    schedule_codes = schedule_values.map(rules.schedule_code_index).fillna(0).to_numpy(dtype=np.uint8)
+    scheduled_in = CleaningUtils.parse_time_minutes(schedule_values.str[0:7], twelve_hour=True)
+    scheduled_out = CleaningUtils.parse_time_minutes(schedule_values.str[8:15], twelve_hour=True)
+    has_time_range = schedule_values.str.count(':').eq(2).to_numpy()
+    is_timed = has_time_range & ~np.isnan(scheduled_in + scheduled_out)
+
+    is_fallback |= (has_time_range & ~is_timed)[schedule_keys].reshape(shape).any(axis=1)
+
+    # Derive the codes of every cell from the punch counts and its schedule value
+    is_timed = is_timed[schedule_keys] & (punch_counts >= 2)
+    employee_limits = rules.policy_limits(merged_df['LOB'], merged_df['Site'])
+    is_late, is_overtime = CleaningUtils.flag_late_and_overtime(
+        scheduled_in[schedule_keys], scheduled_out[schedule_keys], first_punch, last_punch,
+        AttendanceRules.take_limits(employee_limits, np.arange(shape[0]).repeat(shape[1])))
+    schedule_codes = schedule_codes[schedule_keys]
+    is_absent = (punch_counts == 0) & is_scheduled[schedule_keys] & (schedule_codes == 0)
+
+    code_bits = AttendanceMatrix.CODE_BITS
+    codes = (np.where(punch_counts == 1, code_bits['(MIS)'], 0) | np.where(punch_counts >= 3, code_bits['(MUL)'], 0)
+             | np.where(is_absent, code_bits['(ABSENT)'], 0)
+             | np.where(is_timed & is_late, code_bits['(L)'], 0) | np.where(is_timed & is_overtime, code_bits['(OT)'], 0))
+
+    # Rows coded by the string stages carry no typed values
+    is_typed = ~np.repeat(is_fallback, shape[1])
+    matrix_values = [
+        np.where(is_typed & (punch_counts >= 1), first_punch, -1),
+        np.where(is_typed & (punch_counts >= 2), last_punch, -1),
+        np.where(is_typed, np.minimum(punch_counts, 255), 0),
+        np.where(is_typed, codes, 0),
+        np.where(is_typed, schedule_codes, 0)
+    ]
+    in_minutes, out_minutes, punch_counts, codes, schedule_codes = [
+        values.astype(dtype).reshape(shape) for values, dtype in zip(matrix_values, AttendanceMatrix.CELL_DTYPES)]
+
+    unparsed_df = pd.DataFrame(columns=['WB Work Number', 'Date', 'Schedule', 'Attendance'])
+    fallback_cells = np.empty((0, shape[1]), dtype=object)
+    if is_fallback.any():
+      fallback_df = merged_df.iloc[np.flatnonzero(is_fallback)].copy()
+      fallback_schedule = schedule_df.loc[schedule_df['Work Number'].isin(fallback_df['WB Work Number'].values)]
 
-    return missing_information_count, multiple_occurrence_count, absent_count, late_count
+      fallback_df = CleaningUtils.update_attendance_codes(fallback_df, fallback_schedule, rules)
+      fallback_df = CleaningUtils.clean_time_data(fallback_df)
+      fallback_df, unparsed_df = CleaningUtils.merge_final_attendance_codes(CleaningUtils, fallback_df, fallback_schedule, rules)
+      fallback_cells = fallback_df[date_columns].to_numpy(dtype=object)
 
+    matrix = AttendanceMatrix(merged_df.iloc[:, :10].copy(), date_columns, in_minutes, out_minutes, punch_counts,
+                              codes, schedule_codes, is_fallback, fallback_cells, rules.schedule_codes)
+
+    return matrix, unparsed_df
 
   @staticmethod
-  def count_codes_per_manager(data_frame):
-      """Counts the occurrences of specific codes for each manager in the DataFrame.
+  def process_attendance_codes(merged_df, schedule_df, rules=None):
+    """
+    Runs the coding, cleaning and transform stages on merged attendance data.
 
-      Args:
-          data_frame (pandas.DataFrame): The DataFrame containing manager and code information.
+    Args:
+        merged_df (pd.DataFrame): Output of incorporate_master_data.
+        schedule_df (pd.DataFrame): DataFrame containing employee schedule information.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
 
-      Returns:
-          pandas.DataFrame: A DataFrame with columns for manager, code status, and count.
-      """
+    Returns:
+        tuple: The AttendanceMatrix with the final attendance codes, the DataFrame of unparsed
+               time entries and the long-format DataFrame (as from transform_attendance_data).
+    """
+
+    matrix, unparsed_df = CleaningUtils.encode_attendance_matrix(merged_df, schedule_df, rules)
+
+    return matrix, unparsed_df, matrix.to_long_frame()
 
-      managers = []
-      code_statuses = []
-      code_counts = []
-
-      for manager_name in data_frame['Manager'].unique():
-          for code_status in ['(ABSENT)', '(MUL)', '(MIS)', '(L)']:
-              count_of_occurrences = data_frame.loc[
-                  data_frame['Manager'] == manager_name
-              ]['Remarks'].str.contains(code_status).sum()
-              managers.append(manager_name)
-              code_statuses.append(code_status)
-              code_counts.append(count_of_occurrences)
-
-      summary_data_frame = pd.DataFrame({
-          'Manager': managers,
-          'Status': code_statuses,
-          'Count': code_counts
-      })
-
-      return summary_data_frame
-  
   @staticmethod
-  def count_code_per_date(df):
-
-    date_list = []
-    code_list = []
-    code_counts = []
-    for date in df['Date'].unique():
-      for code_remarks in ['(ABSENT)', '(MUL)', '(MIS)', '(L)']:
-        count = df.loc[df['Date'] == date]['Remarks'].str.contains(code_remarks).sum()
-        date_list.append(date)
-        code_list.append(code_remarks)
-        code_counts.append(count)
-
-    count_df = pd.DataFrame({
-        'Date': date_list,
-        'Status': code_list,
-        'Count': code_counts
-    })
+  def process_attendance_codes_in_parallel(merged_df, schedule_df, workers, shard_by='WB Work Number', rules=None):
+    """
+    Runs process_attendance_codes on shards of the merged attendance data in a process pool.
 
-    return count_df
+    Every row of a work number lands in the same shard (so does every row of a LOB, whose
+    values come from the work number), and the results are put back in the original row
+    order, so the output is identical to the serial path.
+
+    Args:
+        merged_df (pd.DataFrame): Output of incorporate_master_data.
+        schedule_df (pd.DataFrame): DataFrame containing employee schedule information.
+        workers (int): Number of worker processes.
+        shard_by (str): 'WB Work Number' to shard by work-number hash or 'LOB' to shard by LOB.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted.
+
+    Returns:
+        tuple: Same as process_attendance_codes.
+    """
 
+    if shard_by == 'WB Work Number':
+      shard_keys = pd.util.hash_pandas_object(merged_df['WB Work Number'], index=False).to_numpy() % workers
+    elif shard_by == 'LOB':
+      shard_keys = merged_df['LOB'].to_numpy()
+    else:
+      raise ValueError(f"Cannot shard attendance data by {shard_by!r}")
+
+    row_positions = np.arange(len(merged_df))
+    shard_positions = [positions for _, positions in pd.Series(row_positions).groupby(shard_keys, sort=True, dropna=False)]
+
+    # Each worker only receives the schedule rows of its own employees
+    shards = []
+    for positions in shard_positions:
+      shard_df = merged_df.iloc[positions.to_numpy()]
+      shards.append((shard_df, schedule_df.loc[schedule_df['Work Number'].isin(shard_df['WB Work Number'].values)], rules))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      results = list(executor.map(CleaningUtils.process_attendance_codes, *zip(*shards)))
+
+    # Restore the serial row order of the wide and long results
+    wide_order = np.argsort(np.concatenate([positions.to_numpy() for positions in shard_positions]), kind='stable')
+    matrix = AttendanceMatrix.concat([shard_matrix for shard_matrix, _, _ in results]).take(wide_order)
+
+    date_count = len(merged_df.columns) - 10
+    long_positions = np.concatenate([
+        (np.repeat(positions.to_numpy(), date_count) * date_count + np.tile(np.arange(date_count), len(positions)))
+        for positions in shard_positions])
+    grouped_df = pd.concat([grouped for _, _, grouped in results]).iloc[np.argsort(long_positions, kind='stable')]
+    grouped_df = grouped_df.reset_index(drop=True)
+
+    # Rebuild the categoricals from the full data, as the serial transform does
+    for column in ['LOB', 'Site', 'Shift', 'Manager']:
+      grouped_df[column] = pd.Categorical(grouped_df[column].to_numpy(dtype=object))
+
+    unparsed_df = pd.concat([unparsed for _, unparsed, _ in results], ignore_index=True)
+    unparsed_df = unparsed_df.drop_duplicates().sort_values(by=['WB Work Number', 'Date'], kind='stable', ignore_index=True)
+
+    return matrix, unparsed_df, grouped_df
+
+class AttendanceRules:
+  """
+  Attendance coding rules: the schedule codes carried into the attendance data and the
+  late/overtime threshold policies, loaded from a JSON config (see load).
+
+  Policies are compiled per distinct (LOB, Site) pair into arrays of limits, so the coding
+  stages evaluate every rule as a vectorized predicate over whole columns of cells.
+
+  Args:
+      attendance_codes (iterable, optional): Schedule codes carried over as ' (CODE)'; CleaningUtils.ATTENDANCE_CODES if omitted.
+      default_policy (dict, optional): Limits overriding DEFAULT_POLICY for every employee.
+      policies (list, optional): Dicts with a 'lob' and/or 'site' and the limits they override; a policy
+                                 matching both the LOB and site wins over one matching the LOB, which wins
+                                 over one matching the site.
+  """
+
+  # Limits of the default policy, which reproduce the original thresholds:
+  #   late when checking in more than late_grace_minutes after the shift start or out more than
+  #   early_out_grace_minutes before its end; overtime when the minutes before the start (if
+  #   early_in_overtime) or after the end, rounded down to overtime_rounding_minutes, reach
+  #   overtime_threshold_minutes; overnight_shifts compares times across midnight within +/- 12 hours
+  DEFAULT_POLICY = {
+      'late_grace_minutes': 0,
+      'early_out_grace_minutes': 0,
+      'overtime_threshold_minutes': 16,
+      'overtime_rounding_minutes': 1,
+      'early_in_overtime': True,
+      'overnight_shifts': True
+  }
+  POLICY_DTYPES = {'late_grace_minutes': np.int16, 'early_out_grace_minutes': np.int16, 'overtime_threshold_minutes': np.int16,
+                   'overtime_rounding_minutes': np.int16, 'early_in_overtime': bool, 'overnight_shifts': bool}
+
+  # Schedule codes are stored as uint8 indexes in an AttendanceMatrix, 0 meaning no code
+  MAX_ATTENDANCE_CODES = 255
+
+  def __init__(self, attendance_codes=None, default_policy=None, policies=None):
+    self.attendance_codes = frozenset(CleaningUtils.ATTENDANCE_CODES if attendance_codes is None else attendance_codes)
+    if len(self.attendance_codes) > AttendanceRules.MAX_ATTENDANCE_CODES:
+      raise ValueError(f"At most {AttendanceRules.MAX_ATTENDANCE_CODES} attendance codes can be configured")
+
+    self.default_policy = AttendanceRules.validate_policy(dict(AttendanceRules.DEFAULT_POLICY, **(default_policy or {})))
+    self.policies = [AttendanceRules.validate_policy(policy, scoped=True) for policy in policies or []]
+
+    # Lookup tables of the schedule codes, index 0 being no code
+    self.schedule_codes = [None] + sorted(self.attendance_codes)
+    self.schedule_code_index = {code: index for index, code in enumerate(self.schedule_codes) if code}
+
+    # Identifies the rules, e.g. in the fingerprints of IncrementalUtils
+    self.fingerprint = hashlib.sha256(json.dumps(
+        [self.schedule_codes[1:], self.default_policy, self.policies], sort_keys=True).encode()).hexdigest()
 
   @staticmethod
-  def plot_code_occurrence_by_date(data_frame, code_status):
-    """Plots the daily occurrences of a specific code status in a DataFrame.
+  def validate_policy(policy, scoped=False):
+    """
+    Checks the keys and values of one policy.
 
     Args:
-        data_frame (pandas.DataFrame): The DataFrame containing code status and date information.
-        code_status (str): The specific code status to plot (e.g., '(L)' for Late).
+        policy (dict): Limits, plus 'lob' and/or 'site' when scoped.
+        scoped (bool): Whether the policy applies to a LOB and/or site.
 
     Returns:
-        plotly.graph_objects.Figure: A plotly figure representing the code occurrences over time.
+        dict: The policy.
+
+    Raises:
+        ValueError: If a key is unknown, a scope is missing or a limit is out of range.
     """
 
-    code_descriptions = {
-        '(L)': 'Late',
-        '(MUL)': 'Multiple Punches',
-        '(MIS)': 'Missed Punch',
-        '(ABSENT)': 'Absent'
-    }
+    scope_keys = {'lob', 'site'} if scoped else set()
+    unknown_keys = set(policy) - set(AttendanceRules.DEFAULT_POLICY) - scope_keys
+    if unknown_keys:
+      raise ValueError(f"Unknown attendance policy settings: {', '.join(sorted(unknown_keys))}")
+    if scoped and not scope_keys & set(policy):
+      raise ValueError(f"Attendance policy {policy} needs a 'lob' or 'site'")
 
-    peak_count = data_frame.loc[data_frame['Status'] == code_status]['Count'].max()
-    peak_date = data_frame.loc[data_frame['Count'] == peak_count]['Date'].values[0]
+    for key, value in policy.items():
+      if key in scope_keys:
+        continue
+      if AttendanceRules.POLICY_DTYPES[key] is bool:
+        if not isinstance(value, bool):
+          raise ValueError(f"Attendance policy setting {key} must be true or false, not {value!r}")
+        continue
 
-    figure = px.line(
-        data_frame.loc[data_frame['Status'] == code_status],
-        x="Date",
-        y="Count",
-        markers=True,
-        title=f"When do the most {code_descriptions[code_status]} entries occur?<br>"
-              f"<sup>Peak: {peak_count} occurrences in {peak_date}</sup>"
-    )
+      lowest = 1 if key in ('overtime_threshold_minutes', 'overtime_rounding_minutes') else 0
+      if isinstance(value, bool) or not isinstance(value, int) or not lowest <= value <= 720:
+        raise ValueError(f"Attendance policy setting {key} must be a whole number of minutes from {lowest} to 720, not {value!r}")
+
+    return policy
 
-    return figure
-  
   @staticmethod
-  def plot_leaders_by_code_occurrence(data_frame, code_status):
-      """Plots a bar chart showing leaders with the most occurrences of a specific code.
+  def load(filepath):
+    """
+    Loads rules from a JSON config, e.g.
 
-      Args:
-          data_frame (pandas.DataFrame): The DataFrame containing code status, manager, and count information.
-          code_status (str): The specific code status to plot (e.g., '(L)' for Late).
+        {"attendance_codes": ["VL", "SL", "OFF"],
+         "default_policy": {"overtime_threshold_minutes": 16},
+         "policies": [{"lob": "RBC", "site": "Makati", "late_grace_minutes": 5, "overtime_rounding_minutes": 15}]}
 
-      Returns:
-          plotly.graph_objects.Figure: A plotly figure representing the leader distribution for the code.
-      """
+    Every key is optional.
 
-      code_descriptions = {
-          '(L)': 'Late',
-          '(MUL)': 'Multiple Punches',
-          '(MIS)': 'Missed Punch',
-          '(ABSENT)': 'Absent'
-      }
+    Args:
+        filepath (str): Path of the JSON config.
 
-      filtered_data = data_frame.loc[data_frame['Status'] == code_status]
-      sorted_data = filtered_data.sort_values(by='Count', ascending=True)
+    Returns:
+        AttendanceRules: The rules.
+    """
 
-      figure = px.bar(
-          sorted_data,
-          x="Count",
-          y="Manager",
-          orientation='h',
-          title=f"Who are responsible for records of {code_descriptions[code_status]}?<br>"
-                f"<sup>Leaders with the Most {code_descriptions[code_status]} Employees</sup>"
-      )
+    with open(filepath, encoding='utf-8') as file:
+      config = json.load(file)
 
-      return figure
+    unknown_keys = set(config) - {'attendance_codes', 'default_policy', 'policies'}
+    if unknown_keys:
+      raise ValueError(f"Unknown attendance rules settings in {filepath}: {', '.join(sorted(unknown_keys))}")
+
+    return AttendanceRules(config.get('attendance_codes'), config.get('default_policy'), config.get('policies'))
+
+  def resolve_policy(self, lob, site):
+    """
+    Resolves the limits of one LOB and site.
+
+    Returns:
+        dict: The default policy overridden by the matching site, LOB, then LOB and site policies.
+    """
+
+    limits = dict(self.default_policy)
+    matches = [policy for policy in self.policies
+               if policy.get('lob', lob) == lob and policy.get('site', site) == site]
+    for policy in sorted(matches, key=lambda policy: ('lob' in policy, 'site' in policy)):
+      limits.update((key, value) for key, value in policy.items() if key not in ('lob', 'site'))
+
+    return limits
+
+  def policy_limits(self, lobs, sites):
+    """
+    Compiles the limits of every row, resolving each distinct (LOB, Site) pair once.
+
+    Args:
+        lobs (array-like): LOB of every row.
+        sites (array-like): Site of every row.
+
+    Returns:
+        dict: Limit name -> one value per row (numpy.ndarray), or a scalar when every row shares it.
+    """
+
+    lobs = pd.Series(lobs, dtype=object).to_numpy()
+    sites = pd.Series(sites, dtype=object).to_numpy()
+    if not self.policies or not len(lobs):
+      return dict(self.default_policy)
+
+    pair_keys, pairs = pd.MultiIndex.from_arrays([lobs, sites]).factorize()
+    resolved = [self.resolve_policy(lob, site) for lob, site in pairs]
+
+    limits = {}
+    for key, dtype in AttendanceRules.POLICY_DTYPES.items():
+      values = np.array([limits_of_pair[key] for limits_of_pair in resolved], dtype=dtype)
+      limits[key] = values[0].item() if (values == values[0]).all() else values[pair_keys]
+
+    return limits
+
+  @staticmethod
+  def take_limits(limits, positions):
+    """Selects the limits of rows by position; scalar limits are shared by every row."""
+    return {key: values[positions] if isinstance(values, np.ndarray) else values for key, values in limits.items()}
+
+
+class AttendanceMatrix:
+  """
+  Typed employee x date matrix of coded attendance, built by CleaningUtils.encode_attendance_matrix.
+
+  Every cell is held in 10 bytes instead of an object string: the first and last punch in
+  minutes since midnight (int16, -1 when missing), the punch count (uint8), the derived codes
+  as bits (uint32, see CODE_BITS) and the schedule code (uint8 index into schedule_code_names,
+  the code table of the AttendanceRules it was coded with).
+  Display strings are only rendered by to_wide_frame and to_long_frame. Rows flagged in
+  is_fallback were coded by the string stages and are kept as their text cells.
+  """
+
+  # Bits of the codes derived by the pipeline
+  CODE_BITS = {'(MIS)': 1, '(MUL)': 2, '(ABSENT)': 4, '(L)': 8, '(OT)': 16}
+
+  # In minutes, out minutes, punch count, code bits and schedule code
+  CELL_DTYPES = [np.int16, np.int16, np.uint8, np.uint32, np.uint8]
+
+  # A punch cell held as typed values: 'HH:MM' lines only
+  PUNCH_LIST_PATTERN = r'\d{2}:\d{2}(?:\n\d{2}:\d{2})*'
+
+  TIME_LABELS = np.array([f'{minutes // 60:02d}:{minutes % 60:02d}' for minutes in range(24 * 60)], dtype=object)
+
+  def __init__(self, employees, dates, in_minutes, out_minutes, punch_counts, codes, schedule_codes, is_fallback, fallback_cells,
+               schedule_code_names):
+    self.employees = employees
+    self.dates = dates
+    self.in_minutes = in_minutes
+    self.out_minutes = out_minutes
+    self.punch_counts = punch_counts
+    self.codes = codes
+    self.schedule_codes = schedule_codes
+    self.is_fallback = is_fallback
+    self.fallback_cells = fallback_cells
+    self.schedule_code_names = schedule_code_names
+
+  def __len__(self):
+    return len(self.employees)
+
+  @staticmethod
+  def concat(matrices):
+    """
+    Stacks the rows of matrices sharing the same dates.
+
+    Args:
+        matrices (list): AttendanceMatrix objects.
+
+    Returns:
+        AttendanceMatrix: The rows of every matrix, in order.
+    """
+
+    stack = lambda attribute: np.concatenate([getattr(matrix, attribute) for matrix in matrices])
 
+    return AttendanceMatrix(pd.concat([matrix.employees for matrix in matrices]), matrices[0].dates,
+                            stack('in_minutes'), stack('out_minutes'), stack('punch_counts'), stack('codes'),
+                            stack('schedule_codes'), stack('is_fallback'), stack('fallback_cells'), matrices[0].schedule_code_names)
+
+  def take(self, positions):
+    """
+    Selects rows by position.
+
+    Args:
+        positions (numpy.ndarray): Row positions.
+
+    Returns:
+        AttendanceMatrix: The selected rows.
+    """
+
+    fallback_ordinals = np.cumsum(self.is_fallback) - 1
+    is_fallback = self.is_fallback[positions]
+
+    return AttendanceMatrix(self.employees.iloc[positions], self.dates, self.in_minutes[positions],
+                            self.out_minutes[positions], self.punch_counts[positions], self.codes[positions],
+                            self.schedule_codes[positions], is_fallback,
+                            self.fallback_cells[fallback_ordinals[positions[is_fallback]]], self.schedule_code_names)
+
+  @staticmethod
+  def render_suffix(punch_count, code_bits, schedule_code):
+    """
+    Renders the codes appended to the times of one kind of cell, as the string stages write them.
+
+    Args:
+        punch_count (int): The punch count, 3 standing for 3 or more.
+        code_bits (int): The derived code bits.
+        schedule_code (str): The schedule code, None for no code.
+
+    Returns:
+        str: The suffix, or None for a cell without punches or codes.
+    """
+
+    schedule_text = f'({schedule_code})' if schedule_code else ''
+    time_codes = ' '.join(code for code in ['(L)', '(OT)'] if code_bits & AttendanceMatrix.CODE_BITS[code])
+    time_codes = f' {time_codes}' if time_codes else ''
+
+    if punch_count == 0:
+      if schedule_code:
+        return f'nan{schedule_text}'
+      return 'nan (ABSENT)' if code_bits & AttendanceMatrix.CODE_BITS['(ABSENT)'] else None
+    if punch_count == 1:
+      return f'{schedule_text}(MIS)'
+    if punch_count == 2:
+      return f'{schedule_text}{time_codes}'
+    return f'{schedule_text}(MUL){time_codes}'
+
+  def render_kinds(self):
+    """
+    Renders each distinct (punch count, codes, schedule code) combination of the cells once.
+
+    Returns:
+        tuple: The kind position of every flat cell and lists of the suffix and Remarks of each kind.
+    """
+
+    punch_counts = np.minimum(self.punch_counts.ravel(), 3).astype(np.int64)
+
+    cell_kinds = (self.schedule_codes.ravel().astype(np.int64) << 40) | (self.codes.ravel().astype(np.int64) << 8) | punch_counts
+    kind_positions, kinds = pd.factorize(cell_kinds)
+    kind_suffixes = [AttendanceMatrix.render_suffix(kind & 0xFF, (kind >> 8) & 0xFFFFFFFF, self.schedule_code_names[kind >> 40])
+                     for kind in kinds]
+
+    # Like the regex of transform_attendance_data, the codes after the times are the remarks
+    # (so '09:01-18:00 (L)' has '(L)'), and cells without punches keep their whole text
+    kind_remarks = [suffix if kind & 0xFF == 0 else (suffix.lstrip() or None)
+                    for kind, suffix in zip(kinds, kind_suffixes)]
+
+    return kind_positions, kind_suffixes, kind_remarks
+
+  def render_cells(self):
+    """
+    Renders the flat cells of the typed rows as display strings.
+
+    Returns:
+        tuple: Object numpy arrays of the wide cells (as written by the string stages),
+               Time In, Time Out and Remarks (None when missing).
+    """
+
+    in_minutes = self.in_minutes.ravel().astype(np.intp)
+    out_minutes = self.out_minutes.ravel().astype(np.intp)
+    punch_counts = np.minimum(self.punch_counts.ravel(), 3).astype(np.int64)
+
+    in_times = np.where(in_minutes >= 0, AttendanceMatrix.TIME_LABELS[in_minutes], None)
+    out_times = np.where(out_minutes >= 0, AttendanceMatrix.TIME_LABELS[out_minutes], None)
+    times = np.where(in_minutes >= 0, in_times, '').astype(object)
+    times[out_minutes >= 0] += '-' + out_times[out_minutes >= 0]
+
+    kind_positions, kind_suffixes, kind_remarks = self.render_kinds()
+
+    suffixes = np.array(kind_suffixes + [None], dtype=object)[kind_positions]
+    remarks = np.array(kind_remarks + [None], dtype=object)[kind_positions]
+
+    has_suffix = pd.notna(suffixes)
+    cells = np.where(punch_counts > 0, times, np.nan).astype(object)
+    cells[has_suffix] = times[has_suffix] + suffixes[has_suffix]
+
+    return cells, in_times, out_times, remarks
+
+  def to_wide_frame(self):
+    """
+    Renders the wide DataFrame, as returned by merge_final_attendance_codes.
+
+    Returns:
+        pd.DataFrame: The employee detail columns and one column of coded cells per date.
+    """
+
+    cells = self.render_cells()[0].reshape(len(self), len(self.dates))
+    cells[self.is_fallback] = self.fallback_cells
+
+    return pd.concat([self.employees, pd.DataFrame(cells, index=self.employees.index, columns=self.dates)], axis=1)
+
+  def to_long_frame(self):
+    """
+    Renders the long-format DataFrame, as returned by transform_attendance_data.
+
+    Returns:
+        pd.DataFrame: One row per employee and date with Time In, Time Out and Remarks.
+    """
+
+    _, in_times, out_times, remarks = self.render_cells()
+
+    # Rows coded by the string stages are split from their text
+    if self.is_fallback.any():
+      fallback_positions = self.fallback_positions()
+      in_times[fallback_positions], out_times[fallback_positions], remarks[fallback_positions] = \
+          CleaningUtils.split_attendance_cells(self.fallback_cells.ravel())
+
+    return CleaningUtils.build_long_frame(self.employees, self.dates, in_times, out_times, remarks)
+
+  def fallback_positions(self):
+    """
+    Returns:
+        numpy.ndarray: The flat cell positions of the rows coded by the string stages.
+    """
+
+    return (np.flatnonzero(self.is_fallback)[:, None] * len(self.dates) + np.arange(len(self.dates))).ravel()
+
+  def code_flags(self):
+    """
+    Flags the attendance codes of every cell without rendering the long-format DataFrame, the
+    same flags as AnalysisUtils.extract_code_flags parses from its 'Remarks' column.
+
+    Returns:
+        pd.DataFrame: One boolean column per code in AnalysisUtils.CODE_STATUSES and one row
+                      per employee and date, in the row order of to_long_frame.
+    """
+
+    kind_positions, _, kind_remarks = self.render_kinds()
+
+    # Parse the remarks of each kind of cell once
+    kind_flags = AnalysisUtils.extract_code_flags(pd.DataFrame({'Remarks': kind_remarks + [None]})).to_numpy()
+    flags = kind_flags[kind_positions]
+
+    if self.is_fallback.any():
+      fallback_remarks = CleaningUtils.split_attendance_cells(self.fallback_cells.ravel())[2]
+      flags[self.fallback_positions()] = AnalysisUtils.extract_code_flags(pd.DataFrame({'Remarks': fallback_remarks})).to_numpy()
+
+    return pd.DataFrame(flags, columns=AnalysisUtils.CODE_STATUSES)
+
+
+class AnalysisUtils:
+
+
+  # Attendance codes tracked by the dashboard, as they appear in the 'Remarks' column
+  CODE_STATUSES = ['(ABSENT)', '(MUL)', '(MIS)', '(L)', '(OT)']
+
+  # Matches one whole code in parentheses, e.g. '(L)' but not '(MUL)' or '(VL)'
+  CODE_PATTERN = r'(\((?:ABSENT|MUL|MIS|L|OT)\))'
+
+  # Matches every code in parentheses of a remark, e.g. '(VL)' and '(MIS)' in 'nan(VL)(MIS)'
+  # or codes such as '(HalfDay)' and '(ABSENT-A)'
+  REMARK_CODE_PATTERN = r'\([^()]+\)'
+
+  # Charts show this many leaders or remark categories; the rest are summed into one 'Other' bar
+  CHART_TOP_N = 15
+  OTHER_LABEL = 'Other'
+
+  CODE_DESCRIPTIONS = {
+      '(L)': 'Late',
+      '(MUL)': 'Multiple Punches',
+      '(MIS)': 'Missed Punch',
+      '(ABSENT)': 'Absent'
+  }
+
+  @staticmethod
+  def extract_code_flags(data_frame):
+    """Parses the 'Remarks' column once into one boolean flag column per attendance code.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing a 'Remarks' column.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with the index of data_frame and one boolean column
+                          per code in AnalysisUtils.CODE_STATUSES.
+    """
+
+    remarks = pd.Series(data_frame['Remarks'].to_numpy(dtype=object), dtype=object)
+
+    # One row per code found in a remark, keyed by the remark's position
+    codes = remarks.str.extractall(AnalysisUtils.CODE_PATTERN)[0]
+    codes = codes.astype(pd.CategoricalDtype(AnalysisUtils.CODE_STATUSES))
+
+    code_flags = pd.get_dummies(codes).groupby(level=0).any()
+    code_flags = code_flags.reindex(index=remarks.index, columns=AnalysisUtils.CODE_STATUSES, fill_value=False)
+    code_flags.index = data_frame.index
+
+    return code_flags
+
+  @staticmethod
+  def count_codes_by(data_frame, column, code_flags=None):
+    """Counts the occurrences of each attendance code per value of a column in one groupby.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing the column and code information.
+        column (str): The column to group by (e.g. 'Manager' or 'Date').
+        code_flags (pandas.DataFrame, optional): Flags from extract_code_flags, parsed here if omitted.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with columns for the grouping column, code status, and count.
+    """
+
+    if code_flags is None:
+      code_flags = AnalysisUtils.extract_code_flags(data_frame)
+
+    code_counts = code_flags[['(ABSENT)', '(MUL)', '(MIS)', '(L)']].groupby(
+        data_frame[column], sort=False, observed=True).sum()
+
+    return code_counts.rename_axis(index=column, columns='Status').stack().reset_index(name='Count')
+
+  @staticmethod
+  def metric_count(data_frame, code_flags=None):
+    """Counts the occurrences of specific codes in the 'Remarks' column of a DataFrame.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing manager and code information.
+        code_flags (pandas.DataFrame, optional): Flags from extract_code_flags, parsed here if omitted.
+
+    Returns:
+        tuple: A tuple containing the counts of 'MIS', 'MUL', 'ABSENT', and 'L' code occurrences.
+    """
+
+    if code_flags is None:
+      code_flags = AnalysisUtils.extract_code_flags(data_frame)
+
+    code_counts = code_flags.sum()
+
+    return code_counts['(MIS)'], code_counts['(MUL)'], code_counts['(ABSENT)'], code_counts['(L)']
+
+
+  @staticmethod
+  def count_codes_per_manager(data_frame, code_flags=None):
+      """Counts the occurrences of specific codes for each manager in the DataFrame.
+
+      Args:
+          data_frame (pandas.DataFrame): The DataFrame containing manager and code information.
+          code_flags (pandas.DataFrame, optional): Flags from extract_code_flags, parsed here if omitted.
+
+      Returns:
+          pandas.DataFrame: A DataFrame with columns for manager, code status, and count.
+      """
+
+      return AnalysisUtils.count_codes_by(data_frame, 'Manager', code_flags)
+  
+  @staticmethod
+  def count_code_per_date(df, code_flags=None):
+    """Counts the occurrences of specific codes for each date in the DataFrame.
+
+    Args:
+        df (pandas.DataFrame): The DataFrame containing date and code information.
+        code_flags (pandas.DataFrame, optional): Flags from extract_code_flags, parsed here if omitted.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with columns for date, code status, and count.
+    """
+
+    return AnalysisUtils.count_codes_by(df, 'Date', code_flags)
+
+
+  @staticmethod
+  def cap_top_n(data_frame, label_column, top_n=None):
+    """Keeps the top_n rows with the highest 'Count' and sums the others into one 'Other' row.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing the label column and a 'Count' column.
+        label_column (str): The column holding the bar labels.
+        top_n (int, optional): The number of rows kept, AnalysisUtils.CHART_TOP_N if omitted.
+
+    Returns:
+        pandas.DataFrame: At most top_n + 1 rows of label_column and 'Count', sorted by ascending count
+                          with the 'Other' row first.
+    """
+
+    top_n = AnalysisUtils.CHART_TOP_N if top_n is None else top_n
+
+    sorted_data = data_frame[[label_column, 'Count']].sort_values(by='Count', ascending=False, kind='stable')
+    top_data = sorted_data.iloc[:top_n].iloc[::-1].astype({label_column: object})
+    if len(sorted_data) <= top_n:
+      return top_data.reset_index(drop=True)
+
+    other_row = pd.DataFrame({label_column: [AnalysisUtils.OTHER_LABEL], 'Count': [sorted_data['Count'].iloc[top_n:].sum()]})
+
+    return pd.concat([other_row, top_data], ignore_index=True)
+
+  @staticmethod
+  def count_remark_categories(data_frame):
+    """Counts the remarks by their codes, so free-text remarks such as '09:01-18:00 (L)' and '(L)' share one category.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing a 'Remarks' column.
+
+    Returns:
+        pandas.DataFrame: A DataFrame with columns for the remark category and count, sorted by descending count.
+    """
+
+    remark_counts = data_frame['Remarks'].value_counts()
+
+    # Categorize each distinct remark once instead of every row
+    categories = remark_counts.index.to_series().astype(str).str.findall(AnalysisUtils.REMARK_CODE_PATTERN).str.join('')
+    categories = categories.replace('', AnalysisUtils.OTHER_LABEL)
+
+    category_counts = remark_counts.groupby(categories.to_numpy(), sort=False).sum()
+
+    return category_counts.sort_values(ascending=False, kind='stable').rename_axis('Remarks').reset_index(name='Count')
+
+  @staticmethod
+  def plot_code_occurrence_by_date(data_frame, code_status):
+    """Plots the daily occurrences of a specific code status in a DataFrame.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing code status and date information.
+        code_status (str): The specific code status to plot (e.g., '(L)' for Late).
+
+    Returns:
+        plotly.graph_objects.Figure: A plotly figure representing the code occurrences over time.
+    """
+
+    import plotly.express as px
+
+    code_description = AnalysisUtils.CODE_DESCRIPTIONS[code_status]
+    status_data = data_frame.loc[data_frame['Status'] == code_status, ['Date', 'Count']]
+
+    # Look the peak up among the rows of this status only
+    if status_data.empty:
+      subtitle = 'No occurrences'
+    else:
+      peak_row = status_data.loc[status_data['Count'].idxmax()]
+      subtitle = f"Peak: {peak_row['Count']} occurrences in {peak_row['Date']}"
+
+    figure = px.line(
+        status_data,
+        x="Date",
+        y="Count",
+        markers=True,
+        title=f"When do the most {code_description} entries occur?<br>"
+              f"<sup>{subtitle}</sup>"
+    )
+
+    return figure
+  
+  @staticmethod
+  def plot_leaders_by_code_occurrence(data_frame, code_status, top_n=None):
+      """Plots a bar chart showing leaders with the most occurrences of a specific code.
+
+      Args:
+          data_frame (pandas.DataFrame): The DataFrame containing code status, manager, and count information.
+          code_status (str): The specific code status to plot (e.g., '(L)' for Late).
+          top_n (int, optional): The number of leaders shown, AnalysisUtils.CHART_TOP_N if omitted.
+
+      Returns:
+          plotly.graph_objects.Figure: A plotly figure representing the leader distribution for the code.
+      """
+
+      import plotly.express as px
+
+      code_description = AnalysisUtils.CODE_DESCRIPTIONS[code_status]
+
+      filtered_data = data_frame.loc[data_frame['Status'] == code_status]
+      top_data = AnalysisUtils.cap_top_n(filtered_data, 'Manager', top_n)
+
+      figure = px.bar(
+          top_data,
+          x="Count",
+          y="Manager",
+          orientation='h',
+          title=f"Who are responsible for records of {code_description}?<br>"
+                f"<sup>Leaders with the Most {code_description} Employees</sup>"
+      )
+
+      return figure
+
+  @staticmethod
+  def plot_remark_categories(data_frame, top_n=None):
+    """Plots a bar chart of the remark categories from count_remark_categories.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame containing remark category and count information.
+        top_n (int, optional): The number of categories shown, AnalysisUtils.CHART_TOP_N if omitted.
+
+    Returns:
+        plotly.graph_objects.Figure: A plotly figure representing the remark counts.
+    """
+
+    import plotly.express as px
+
+    figure = px.bar(
+        AnalysisUtils.cap_top_n(data_frame, 'Remarks', top_n),
+        x="Count",
+        y="Remarks",
+        orientation='h',
+        title="Remarks' Value Counts"
+    )
+
+    return figure
+
+
+class ExportUtils:
+
+  # Download formats: file extension and MIME type
+  EXPORT_FORMATS = {
+      'Excel': ('xlsx', 'application/vnd.ms-excel'),
+      'CSV': ('csv', 'text/csv'),
+      'Parquet': ('parquet', 'application/octet-stream')
+  }
+
+  # Exports larger than this are spooled to a temporary file instead of being held in memory
+  SPOOL_MAX_BYTES = 32 * 1024 * 1024
+
+  # Rows converted for the xlsx writer at a time
+  CHUNK_ROWS = 10000
+
+  SHEET_NAME = 'Neusoft_MNL_attendance'
+
+  @staticmethod
+  def write_xlsx(data_frame, file):
+    """Writes a DataFrame to an xlsx file row by row with xlsxwriter's constant_memory mode.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame to export.
+        file (str or file-like): Destination path or binary file object.
+    """
+
+    workbook = xlsxwriter.Workbook(file, {'constant_memory': True})
+    worksheet = workbook.add_worksheet(ExportUtils.SHEET_NAME)
+    header_format = workbook.add_format({'bold': True, 'border': 1})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+
+    worksheet.write_row(0, 0, data_frame.columns, header_format)
+
+    # Convert a chunk of rows at a time; missing values are left blank and every row is
+    # flushed to disk as soon as the next one starts
+    for chunk_start in range(0, len(data_frame), ExportUtils.CHUNK_ROWS):
+      chunk = data_frame.iloc[chunk_start:chunk_start + ExportUtils.CHUNK_ROWS]
+      values = chunk.astype(object).where(chunk.notna(), None)
+      for row_number, row in enumerate(values.itertuples(index=False, name=None), start=chunk_start + 1):
+        for column_number, value in enumerate(row):
+          if isinstance(value, (datetime, date)):
+            worksheet.write_datetime(row_number, column_number, value, date_format)
+          elif value is not None:
+            worksheet.write(row_number, column_number, value)
+
+    workbook.close()
+
+  @staticmethod
+  def write_export(data_frame, file, file_format):
+    """Writes a DataFrame in one of the EXPORT_FORMATS.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame to export.
+        file (str or file-like): Destination path or binary file object.
+        file_format (str): A key of EXPORT_FORMATS.
+    """
+
+    if file_format == 'Excel':
+      ExportUtils.write_xlsx(data_frame, file)
+    elif file_format == 'CSV':
+      data_frame.to_csv(file, index=False, encoding='utf-8')
+    elif file_format == 'Parquet':
+      data_frame.to_parquet(file, index=False)
+    else:
+      raise ValueError(f"Unknown export format: {file_format}")
+
+  @staticmethod
+  def export(data_frame, file_format):
+    """Exports a DataFrame into a temporary file that spills to disk once it grows past SPOOL_MAX_BYTES.
+
+    Args:
+        data_frame (pandas.DataFrame): The DataFrame to export.
+        file_format (str): A key of EXPORT_FORMATS.
+
+    Returns:
+        tempfile.SpooledTemporaryFile: The exported file, positioned at its start.
+    """
+
+    exported_file = tempfile.SpooledTemporaryFile(max_size=ExportUtils.SPOOL_MAX_BYTES)
+    ExportUtils.write_export(data_frame, exported_file, file_format)
+    exported_file.seek(0)
+
+    return exported_file
+
+
+class IncrementalUtils:
+
+  # Files of an incremental store directory
+  RECORDS_FILE = 'attendance.parquet'
+  FINGERPRINTS_FILE = 'days.parquet'
+  EXTRACTS_FILE = 'extracts.parquet'
+
+  # Bumped whenever the coding of the stored records changes, so older days are re-coded
+  RECORDS_VERSION = 2
+
+  @staticmethod
+  def hash_frame(data_frame):
+    """
+    Hashes the values of a DataFrame as text.
+
+    Missing values hash alike whether they are NaN, None or NaT, so frames loaded from a
+    snapshot (where they come back as None) keep the fingerprints of freshly parsed ones.
+
+    Args:
+        data_frame (pd.DataFrame): The DataFrame to hash.
+
+    Returns:
+        bytes: The row hashes.
+    """
+
+    values = data_frame.astype(object)
+    values = values.where(values.notna(), np.nan)
+
+    return pd.util.hash_pandas_object(values.astype(str), index=False).to_numpy().tobytes()
+
+  @staticmethod
+  def extract_key(work_numbers):
+    """
+    Identifies an attendance extract by its set of employees, so extracts of different teams
+    sharing a store keep their own day fingerprints.
+
+    Args:
+        work_numbers (iterable): Normalized work numbers of the extract.
+
+    Returns:
+        str: A short hex digest.
+    """
+
+    return hashlib.sha256('\n'.join(sorted(set(work_numbers))).encode()).hexdigest()[:16]
+
+  @staticmethod
+  def day_fingerprints(attendance_df, master_list, schedule_df, date_list, rules=None):
+    """
+    Fingerprints the inputs of every attendance date, so a day is only re-coded when they change.
+
+    A day's fingerprint covers its raw punches and schedule cells (with their work numbers),
+    the master records of the employees in the upload, the coding rules, when given, and
+    RECORDS_VERSION.
+
+    Args:
+        attendance_df (pd.DataFrame): Output of CleaningUtils.generate_attendance_dataframe.
+        master_list (pd.DataFrame): Output of CleaningUtils.create_master_employee_list.
+        schedule_df (pd.DataFrame): Output of CleaningUtils.create_schedule_dataframe.
+        date_list (list): Attendance dates ('%Y-%m-%d').
+        rules (AttendanceRules, optional): Coding rules; omitted for the default rules.
+
+    Returns:
+        pd.Series: A hex digest per date.
+    """
+
+    work_numbers = CleaningUtils.normalize_work_numbers(attendance_df['WB Work Number']).to_numpy()
+    scheduled = schedule_df.loc[schedule_df['Work Number'].isin(work_numbers)]
+    master_records = master_list.loc[master_list['WB Work Number'].isin(work_numbers)]
+    master_hash = f'v{IncrementalUtils.RECORDS_VERSION}'.encode()
+    master_hash += IncrementalUtils.hash_frame(master_records)
+    if rules is not None:
+      master_hash += rules.fingerprint.encode()
+
+    fingerprints = {}
+    for date_column in date_list:
+      digest = hashlib.sha256(master_hash)
+      punches = pd.DataFrame({'WB Work Number': work_numbers, 'Punches': attendance_df[date_column].to_numpy()})
+      digest.update(IncrementalUtils.hash_frame(punches))
+      digest.update(IncrementalUtils.hash_frame(scheduled[['Work Number', date_column]]))
+      fingerprints[date_column] = digest.hexdigest()
+
+    return pd.Series(fingerprints, name='Fingerprint', dtype=object).rename_axis('Date')
+
+  @staticmethod
+  def load_store(store_dir):
+    """
+    Loads the processed long-format records, day fingerprints and extracts of an incremental store.
+
+    Args:
+        store_dir (str): Store directory; a missing directory is an empty store.
+
+    Returns:
+        tuple: The stored records DataFrame (None when empty), a Series of fingerprints by
+               (Extract, Date) and a DataFrame of the work numbers of each extract.
+    """
+
+    records_path = os.path.join(store_dir, IncrementalUtils.RECORDS_FILE)
+    fingerprints_path = os.path.join(store_dir, IncrementalUtils.FINGERPRINTS_FILE)
+    extracts_path = os.path.join(store_dir, IncrementalUtils.EXTRACTS_FILE)
+
+    fingerprints = pd.Series(name='Fingerprint', dtype=object,
+                             index=pd.MultiIndex.from_arrays([[], []], names=['Extract', 'Date']))
+    extracts = pd.DataFrame({'Extract': pd.Series(dtype=object), 'WB Work Number': pd.Series(dtype=object)})
+
+    if not os.path.exists(records_path):
+      return None, fingerprints, extracts
+
+    # Stores written before fingerprints were kept per extract have all their days re-coded once
+    if os.path.exists(fingerprints_path) and os.path.exists(extracts_path):
+      stored_fingerprints = pd.read_parquet(fingerprints_path)
+      if 'Extract' in stored_fingerprints.columns:
+        fingerprints = stored_fingerprints.set_index(['Extract', 'Date'])['Fingerprint']
+        extracts = pd.read_parquet(extracts_path)
+
+    return pd.read_parquet(records_path), fingerprints, extracts
+
+  @staticmethod
+  def save_store(store_dir, records, fingerprints, extracts):
+    """
+    Writes the records, day fingerprints and extracts of an incremental store, replacing each file atomically.
+
+    Args:
+        store_dir (str): Store directory, created if missing.
+        records (pd.DataFrame): Long-format records.
+        fingerprints (pd.Series): Fingerprints by (Extract, Date).
+        extracts (pd.DataFrame): Work numbers of each extract.
+    """
+
+    os.makedirs(store_dir, exist_ok=True)
+
+    for file_name, data_frame in [(IncrementalUtils.RECORDS_FILE, records),
+                                  (IncrementalUtils.FINGERPRINTS_FILE, fingerprints.reset_index()),
+                                  (IncrementalUtils.EXTRACTS_FILE, extracts)]:
+      temporary_path = os.path.join(store_dir, f'.{file_name}.tmp')
+      data_frame.to_parquet(temporary_path, index=False)
+      os.replace(temporary_path, os.path.join(store_dir, file_name))
+
+  @staticmethod
+  def process_attendance_incrementally(attendance_df, date_list, master_list, schedule_df, store_dir, workers=1, rules=None):
+    """
+    Runs the pipeline only for the dates that are new or whose inputs changed since the last run,
+    and merges them into the store keyed by (WB Work Number, Date).
+
+    Day fingerprints are kept per extract (its set of employees), so extracts of different
+    teams can share a store. Re-processing a date of an extract invalidates that date for
+    the other extracts with the same employees, since their stored records were replaced.
+
+    Args:
+        attendance_df (pd.DataFrame): Output of CleaningUtils.generate_attendance_dataframe.
+        date_list (list): Attendance dates ('%Y-%m-%d').
+        master_list (pd.DataFrame): Output of CleaningUtils.create_master_employee_list.
+        schedule_df (pd.DataFrame): Output of CleaningUtils.create_schedule_dataframe.
+        store_dir (str): Store directory.
+        workers (int): Worker processes for the coding stages; 1 runs them serially.
+        rules (AttendanceRules, optional): Coding rules; the default rules if omitted. Dates are
+                                           re-processed when the rules change.
+
+    Returns:
+        tuple: The long-format DataFrame for every date of the upload (same rows as
+               transform_attendance_data), the DataFrame of unparsed time entries of the
+               re-processed dates and the list of re-processed dates.
+    """
+
+    stored_records, stored_fingerprints, extracts = IncrementalUtils.load_store(store_dir)
+    work_numbers = pd.Index(CleaningUtils.normalize_work_numbers(attendance_df['WB Work Number'])).drop_duplicates()
+    extract = IncrementalUtils.extract_key(work_numbers)
+    fingerprints = IncrementalUtils.day_fingerprints(attendance_df, master_list, schedule_df, date_list, rules)
+
+    changed_dates = [date_column for date_column in date_list
+                     if stored_fingerprints.get((extract, date_column)) != fingerprints[date_column]]
+    unparsed_df = pd.DataFrame(columns=['WB Work Number', 'Date', 'Schedule', 'Attendance'])
+
+    if changed_dates:
+      # Run the pipeline on the changed date columns only; every stage works cell by cell
+      changed_df = attendance_df[list(attendance_df.columns[:6]) + changed_dates].copy()
+      merged_df = CleaningUtils.incorporate_master_data(changed_df, master_list, changed_dates)
+
+      if workers > 1:
+        _, unparsed_df, grouped_df = CleaningUtils.process_attendance_codes_in_parallel(merged_df, schedule_df, workers, rules=rules)
+      else:
+        _, unparsed_df, grouped_df = CleaningUtils.process_attendance_codes(merged_df, schedule_df, rules)
+
+      # Replace the stored records of the upload's employees on the changed dates
+      if stored_records is not None:
+        is_replaced = stored_records['Date'].astype(str).isin(changed_dates) & stored_records['WB Work Number'].isin(work_numbers)
+        stored_records = stored_records.loc[~is_replaced]
+      stored_records = pd.concat([stored_records, grouped_df], ignore_index=True)
+      for column in ['LOB', 'Site', 'Shift', 'Manager']:
+        stored_records[column] = pd.Categorical(stored_records[column].to_numpy(dtype=object))
+
+      # The changed dates of every extract sharing employees with this one are re-coded on its next run
+      overlapping_extracts = set(extracts.loc[extracts['WB Work Number'].isin(work_numbers), 'Extract']) | {extract}
+      is_invalidated = (stored_fingerprints.index.get_level_values('Extract').isin(list(overlapping_extracts))
+                        & stored_fingerprints.index.get_level_values('Date').isin(changed_dates))
+      changed_fingerprints = fingerprints[changed_dates]
+      changed_fingerprints.index = pd.MultiIndex.from_product([[extract], changed_dates], names=['Extract', 'Date'])
+      stored_fingerprints = pd.concat([stored_fingerprints[~is_invalidated], changed_fingerprints])
+
+      if extract not in set(extracts['Extract']):
+        extracts = pd.concat([extracts, pd.DataFrame({'Extract': extract, 'WB Work Number': work_numbers.to_numpy(dtype=object)})],
+                             ignore_index=True)
+
+      IncrementalUtils.save_store(store_dir, stored_records, stored_fingerprints, extracts)
+
+    # Return the upload's employees and dates employee by employee, like transform_attendance_data
+    records = stored_records.loc[stored_records['Date'].astype(str).isin(date_list) & stored_records['WB Work Number'].isin(work_numbers)]
+    row_order = np.lexsort((records['Date'].astype(str).to_numpy(), work_numbers.get_indexer(records['WB Work Number'])))
+
+    return records.iloc[row_order].reset_index(drop=True), unparsed_df, changed_dates
+
+
+class RollupUtils:
+
+  # Columns kept per employee and date in the roll-up store, besides the code flags
+  RECORD_COLUMNS = ['Date', 'WB Work Number', 'Employee Name', 'Manager', 'LOB', 'Site', 'Shift']
+
+  # The store is partitioned by month, e.g. 'Month=2024-01/records.parquet'
+  PARTITION_COLUMN = 'Month'
+  PARTITION_FILE = 'records.parquet'
+
+  @staticmethod
+  def add_period(store_dir, grouped_df, code_flags=None):
+    """
+    Adds the code flags of one processed attendance period to the roll-up store, replacing
+    the stored records of the same (WB Work Number, Date) so re-processed periods are not counted twice.
+
+    Args:
+        store_dir (str): Roll-up store directory, created if missing.
+        grouped_df (pd.DataFrame): Output of transform_attendance_data.
+        code_flags (pd.DataFrame, optional): Flags from AnalysisUtils.extract_code_flags, parsed here if omitted.
+
+    Returns:
+        list: The months ('%Y-%m') written.
+    """
+
+    if code_flags is None:
+      code_flags = AnalysisUtils.extract_code_flags(grouped_df)
+
+    records = grouped_df[RollupUtils.RECORD_COLUMNS].copy()
+    for column in ['Manager', 'LOB', 'Site', 'Shift']:
+      records[column] = records[column].astype(object)
+    records = pd.concat([records, code_flags], axis=1)
+    records['Date'] = pd.to_datetime(records['Date']).dt.date
+    months = pd.to_datetime(records['Date']).dt.strftime('%Y-%m')
+
+    for month, month_records in records.groupby(months.to_numpy(), sort=True):
+      partition_dir = os.path.join(store_dir, f'{RollupUtils.PARTITION_COLUMN}={month}')
+      partition_path = os.path.join(partition_dir, RollupUtils.PARTITION_FILE)
+
+      if os.path.exists(partition_path):
+        stored_records = pd.read_parquet(partition_path)
+        stored_keys = pd.MultiIndex.from_frame(stored_records[['WB Work Number', 'Date']])
+        new_keys = pd.MultiIndex.from_frame(month_records[['WB Work Number', 'Date']])
+        month_records = pd.concat([stored_records.loc[~stored_keys.isin(new_keys)], month_records], ignore_index=True)
+
+      os.makedirs(partition_dir, exist_ok=True)
+      temporary_path = f'{partition_path}.tmp'
+      month_records.to_parquet(temporary_path, index=False)
+      os.replace(temporary_path, partition_path)
+
+    return sorted(months.unique())
+
+  @staticmethod
+  def period_dates(period, as_of=None):
+    """
+    Resolves a period name into its first and last date.
+
+    Args:
+        period (str): 'YTD', a year ('2024'), a quarter ('2024-Q1') or a month ('2024-03').
+        as_of (date, optional): End of the 'YTD' period, today if omitted.
+
+    Returns:
+        tuple: The first and last date of the period.
+    """
+
+    if period.upper() == 'YTD':
+      as_of = as_of or date.today()
+      return date(as_of.year, 1, 1), as_of
+
+    quarter = re.fullmatch(r'(\d{4})-Q([1-4])', period.upper())
+    if quarter:
+      start = pd.Timestamp(int(quarter[1]), 3 * int(quarter[2]) - 2, 1)
+      return start.date(), (start + pd.offsets.QuarterEnd(0)).date()
+    if re.fullmatch(r'\d{4}', period):
+      return date(int(period), 1, 1), date(int(period), 12, 31)
+    if re.fullmatch(r'\d{4}-\d{2}', period):
+      start = pd.Timestamp(f'{period}-01')
+      return start.date(), (start + pd.offsets.MonthEnd(0)).date()
+
+    raise ValueError(f"Unknown period {period!r}; use YTD, YYYY, YYYY-Qn or YYYY-MM")
+
+  @staticmethod
+  def load_records(store_dir, start_date, end_date, columns=None):
+    """
+    Loads the stored records between two dates, reading only the month partitions they span.
+
+    Args:
+        store_dir (str): Roll-up store directory.
+        start_date (date): First date.
+        end_date (date): Last date.
+        columns (list, optional): Columns to read; all columns if omitted.
+
+    Returns:
+        pd.DataFrame: The records, with a 'Month' column.
+    """
+
+    months = pd.period_range(start_date, end_date, freq='M').strftime('%Y-%m').tolist()
+    months = [month for month in months
+              if os.path.exists(os.path.join(store_dir, f'{RollupUtils.PARTITION_COLUMN}={month}', RollupUtils.PARTITION_FILE))]
+    if not months:
+      return pd.DataFrame(columns=(columns or RollupUtils.RECORD_COLUMNS + AnalysisUtils.CODE_STATUSES) + [RollupUtils.PARTITION_COLUMN])
+
+    # Partition pruning on the month, then row filtering on the exact dates
+    read_columns = None if columns is None else list(dict.fromkeys(['Date', *columns, RollupUtils.PARTITION_COLUMN]))
+    records = pd.read_parquet(store_dir, columns=read_columns, filters=[
+        (RollupUtils.PARTITION_COLUMN, 'in', months), ('Date', '>=', start_date), ('Date', '<=', end_date)])
+    records[RollupUtils.PARTITION_COLUMN] = records[RollupUtils.PARTITION_COLUMN].astype(str)
+
+    return records
+
+  @staticmethod
+  def count_codes(store_dir, by, start_date, end_date):
+    """
+    Counts the occurrences of each attendance code over a date range, like AnalysisUtils.count_codes_by.
+
+    Args:
+        store_dir (str): Roll-up store directory.
+        by (list): Columns to group by, e.g. ['Manager'] or ['Month', 'LOB'] for a monthly trend.
+        start_date (date): First date.
+        end_date (date): Last date.
+
+    Returns:
+        pd.DataFrame: A DataFrame with columns for the grouping columns, code status, and count.
+    """
+
+    statuses = ['(ABSENT)', '(MUL)', '(MIS)', '(L)']
+    records = RollupUtils.load_records(store_dir, start_date, end_date, columns=list(by) + statuses)
+
+    code_counts = records[statuses].astype(int).groupby([records[column] for column in by], sort=True, observed=True).sum()
+
+    return code_counts.rename_axis(columns='Status').stack().reset_index(name='Count')
+
+
+class SnapshotUtils:
+
+  # Bump when the parsed master list or schedule layout changes, so stale snapshots are not loaded
+  SNAPSHOT_VERSION = 2
+
+  # Low-cardinality columns stored as categoricals
+  CATEGORICAL_COLUMNS = {
+      'master': ['LOB', 'Site', 'Shift', 'Leader'],
+      'schedule': ['LOB']
+  }
+
+  # Parse options that change the parsed frame, so each of their values gets its own snapshot
+  KEYED_OPTIONS = {
+      'master': [],
+      'schedule': ['sheet_names']
+  }
+
+  @staticmethod
+  def file_hash(filepath):
+    """
+    Computes the SHA-256 of a workbook's bytes.
+
+    Args:
+        filepath (str or file-like): Path to (or file-like object of) the workbook.
+
+    Returns:
+        str: The hex digest.
+    """
+
+    digest = hashlib.sha256()
+    if hasattr(filepath, 'read'):
+      position = filepath.tell()
+      filepath.seek(0)
+      digest.update(filepath.read())
+      filepath.seek(position)
+    else:
+      with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+          digest.update(block)
+
+    return digest.hexdigest()
+
+  @staticmethod
+  def options_hash(kind, parse_options):
+    """
+    Identifies the KEYED_OPTIONS given to a parse function.
+
+    Args:
+        kind (str): 'master' or 'schedule'.
+        parse_options (dict): Keyword arguments of the parse function.
+
+    Returns:
+        str: A short hex digest, or None when the keyed options are left at their defaults.
+    """
+
+    keyed_options = {name: parse_options[name] for name in SnapshotUtils.KEYED_OPTIONS.get(kind, [])
+                     if parse_options.get(name) is not None}
+    if not keyed_options:
+      return None
+
+    return hashlib.sha256(json.dumps(keyed_options, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+  @staticmethod
+  def snapshot_path(snapshot_dir, kind, source_hash, options_hash=None):
+    options_suffix = f'-{options_hash}' if options_hash else ''
+    return os.path.join(snapshot_dir, f'{kind}-v{SnapshotUtils.SNAPSHOT_VERSION}-{source_hash}{options_suffix}.parquet')
+
+  @staticmethod
+  def to_snapshot_types(data_frame, kind):
+    """
+    Gives a parsed frame Parquet-friendly types: categorical low-cardinality columns, and
+    strings for object columns that mix values of different types (e.g. numbers and text).
+
+    Args:
+        data_frame (pd.DataFrame): Parsed master list or schedule.
+        kind (str): 'master' or 'schedule'.
+
+    Returns:
+        pd.DataFrame: The typed DataFrame.
+    """
+
+    typed_df = data_frame.copy()
+    for column in typed_df.columns:
+      if typed_df[column].dtype == object and pd.api.types.infer_dtype(typed_df[column], skipna=True).startswith('mixed'):
+        typed_df[column] = typed_df[column].where(typed_df[column].isna(), typed_df[column].astype(str))
+    for column in SnapshotUtils.CATEGORICAL_COLUMNS[kind]:
+      typed_df[column] = typed_df[column].astype('category')
+
+    return typed_df
+
+  @staticmethod
+  def load(filepath, kind, snapshot_dir, **parse_options):
+    """
+    Loads a parsed master list or schedule from its snapshot, parsing the workbook and
+    writing the snapshot on the first run. Snapshots are keyed by the workbook's content
+    and by the KEYED_OPTIONS given, e.g. the schedule sheet_names.
+
+    Args:
+        filepath (str or file-like): Path to (or file-like object of) the workbook.
+        kind (str): 'master' (create_master_employee_list) or 'schedule' (create_schedule_dataframe).
+        snapshot_dir (str): Snapshot directory.
+        **parse_options: Keyword arguments of the parse function (e.g. workers for the schedule).
+
+    Returns:
+        pd.DataFrame: The parsed frame.
+    """
+
+    path = SnapshotUtils.snapshot_path(snapshot_dir, kind, SnapshotUtils.file_hash(filepath),
+                                       SnapshotUtils.options_hash(kind, parse_options))
+    if os.path.exists(path):
+      return pd.read_parquet(path, memory_map=True)
+
+    if kind == 'master':
+      data_frame = CleaningUtils.create_master_employee_list(filepath, **parse_options)
+    elif kind == 'schedule':
+      data_frame = CleaningUtils.create_schedule_dataframe(filepath, **parse_options)
+    else:
+      raise ValueError(f"Unknown snapshot kind: {kind}")
+
+    data_frame = SnapshotUtils.to_snapshot_types(data_frame, kind)
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    temporary_path = f'{path}.tmp'
+    data_frame.to_parquet(temporary_path, index=False, compression='zstd')
+    os.replace(temporary_path, path)
+
+    return data_frame
+
+  @staticmethod
+  def list_snapshots(snapshot_dir):
+    """
+    Lists the snapshots of a directory.
+
+    Args:
+        snapshot_dir (str): Snapshot directory.
+
+    Returns:
+        pd.DataFrame: One row per snapshot with its kind, version, source hash, options hash
+                      (None for the default parse options), size and modification time.
+    """
+
+    snapshots = []
+    if os.path.isdir(snapshot_dir):
+      for file_name in sorted(os.listdir(snapshot_dir)):
+        match = re.fullmatch(r'(master|schedule)-v(\d+)-([0-9a-f]{64})(?:-([0-9a-f]{16}))?\.parquet', file_name)
+        if match:
+          stat = os.stat(os.path.join(snapshot_dir, file_name))
+          snapshots.append({
+              'Kind': match.group(1),
+              'Version': int(match.group(2)),
+              'Hash': match.group(3),
+              'Options': match.group(4),
+              'Size (KB)': round(stat.st_size / 1024, 1),
+              'Modified': datetime.fromtimestamp(stat.st_mtime),
+              'File': file_name
+          })
+
+    return pd.DataFrame(snapshots, columns=['Kind', 'Version', 'Hash', 'Options', 'Size (KB)', 'Modified', 'File'])
+
+  @staticmethod
+  def evict_snapshots(snapshot_dir, hashes=None, older_than_days=None):
+    """
+    Deletes snapshots: those whose source hash starts with one of the given prefixes, those older
+    than a number of days, snapshots of older versions, or all of them when no filter is given.
+
+    Args:
+        snapshot_dir (str): Snapshot directory.
+        hashes (list, optional): Source hash prefixes to evict.
+        older_than_days (float, optional): Evict snapshots not modified for this many days.
+
+    Returns:
+        list: The deleted file names.
+    """
+
+    snapshots = SnapshotUtils.list_snapshots(snapshot_dir)
+
+    is_evicted = snapshots['Version'] != SnapshotUtils.SNAPSHOT_VERSION
+    if hashes:
+      is_evicted |= snapshots['Hash'].apply(lambda source_hash: any(source_hash.startswith(prefix) for prefix in hashes))
+    if older_than_days is not None:
+      is_evicted |= snapshots['Modified'] < datetime.now() - timedelta(days=older_than_days)
+    if not hashes and older_than_days is None:
+      is_evicted[:] = True
+
+    for file_name in snapshots.loc[is_evicted, 'File']:
+      os.remove(os.path.join(snapshot_dir, file_name))
+
+    return snapshots.loc[is_evicted, 'File'].tolist()
+
+
+class PipelineProfiler:
+  """
+  Records the wall time, input/output row counts and peak memory of pipeline stages.
+
+  Args:
+      track_memory (bool): Measure each stage's peak Python memory with tracemalloc (slows stages down).
+      profile_dir (str, optional): Write a profile of every stage into this directory.
+      profiler (str): 'cprofile' (a .prof file for pstats/snakeviz) or 'pyinstrument' (an .html report,
+                      needs the pyinstrument package).
+  """
+
+  # tracemalloc is process-wide, so stages measuring memory run one at a time across threads;
+  # reentrant as stages may run nested stages with the same profiler
+  MEMORY_LOCK = threading.RLock()
+
+  def __init__(self, track_memory=False, profile_dir=None, profiler='cprofile'):
+    self.track_memory = track_memory
+    self.profile_dir = profile_dir
+    self.profiler = profiler
+    self.records = []
+
+  @staticmethod
+  def count_rows(value):
+    # Rows of the first DataFrame or AttendanceMatrix in a value or tuple of values
+    for item in (value if isinstance(value, (tuple, list)) else [value]):
+      if isinstance(item, (pd.DataFrame, AttendanceMatrix)):
+        return len(item)
+    return None
+
+  def run(self, stage, function, *args, **kwargs):
+    """
+    Runs function(*args, **kwargs) as a named stage and records its measurements.
+
+    Returns:
+        The function's result.
+    """
+
+    if not self.track_memory:
+      start = time.perf_counter()
+      result = self.run_with_profile(stage, function, *args, **kwargs)
+      seconds = time.perf_counter() - start
+      peak_memory_mb = None
+    else:
+      with PipelineProfiler.MEMORY_LOCK:
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+          tracemalloc.start()
+        try:
+          tracemalloc.reset_peak()
+          memory_at_start = tracemalloc.get_traced_memory()[0]
+
+          start = time.perf_counter()
+          result = self.run_with_profile(stage, function, *args, **kwargs)
+          seconds = time.perf_counter() - start
+
+          peak_memory_mb = round((tracemalloc.get_traced_memory()[1] - memory_at_start) / 1024 ** 2, 1)
+        finally:
+          if started_tracing:
+            tracemalloc.stop()
+
+    input_rows = next((rows for rows in map(PipelineProfiler.count_rows, list(args) + list(kwargs.values())) if rows is not None), None)
+    self.record(stage, seconds, input_rows, PipelineProfiler.count_rows(result), peak_memory_mb)
+
+    return result
+
+  def record(self, stage, seconds, input_rows=None, output_rows=None, peak_memory_mb=None):
+    """Records the measurements of a stage timed elsewhere, e.g. in a worker process."""
+    self.records.append({
+        'Stage': stage,
+        'Seconds': round(seconds, 3),
+        'Input Rows': input_rows,
+        'Output Rows': output_rows,
+        'Peak Memory (MB)': peak_memory_mb
+    })
+
+  def run_with_profile(self, stage, function, *args, **kwargs):
+    if self.profile_dir is None:
+      return function(*args, **kwargs)
+
+    os.makedirs(self.profile_dir, exist_ok=True)
+    stage_slug = re.sub(r'\W+', '_', stage).strip('_')
+    file_stem = os.path.join(self.profile_dir, f'{len(self.records):02d}-{stage_slug}')
+
+    if self.profiler == 'pyinstrument':
+      from pyinstrument import Profiler
+
+      profiler = Profiler()
+      profiler.start()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        profiler.stop()
+        with open(f'{file_stem}.html', 'w', encoding='utf-8') as file:
+          file.write(profiler.output_html())
+
+    profiler = cProfile.Profile()
+    try:
+      return profiler.runcall(function, *args, **kwargs)
+    finally:
+      profiler.dump_stats(f'{file_stem}.prof')
+
+  def to_frame(self):
+    """Returns the recorded stages as a DataFrame."""
+    profile_df = pd.DataFrame(self.records, columns=['Stage', 'Seconds', 'Input Rows', 'Output Rows', 'Peak Memory (MB)'])
+    return profile_df.astype({'Input Rows': 'Int64', 'Output Rows': 'Int64'})
+
+  def to_json(self):
+    """Returns the recorded stages as a JSON string."""
+    return json.dumps(self.records, indent=2)
+
+
+class PipelineJob:
+  """
+  A pipeline run submitted to a PipelineJobRunner, with stage-level progress and
+  cancellation between stages.
+
+  Args:
+      key (hashable): Identifies the inputs of the run.
+      stage_count (int): Number of stages the pipeline function runs, for the progress fraction.
+      profiler (PipelineProfiler): Records the measurements of each stage.
+  """
+
+  class Cancelled(Exception):
+    """Raised at the next stage boundary of a cancelled job."""
+
+  def __init__(self, key, stage_count, profiler):
+    self.key = key
+    self.stage_count = stage_count
+    self.profiler = profiler
+    self.status = 'queued'
+    self.completed_stages = 0
+    self.current_stage = None
+    self._result = None
+    self.result_bytes = 0
+    self.spill_path = None
+    self.error = None
+    self.finished_at = None
+    self.cancel_requested = threading.Event()
+    # Guards the result against being spilled by another thread while it is read
+    self.result_lock = threading.Lock()
+
+  @property
+  def result(self):
+    """The pipeline's result, read back from the spill file if it was spilled to disk."""
+    with self.result_lock:
+      result = self._result
+      if result is None and self.spill_path is not None:
+        with open(self.spill_path, 'rb') as file:
+          result = pickle.load(file)
+        self._result = result
+    return result
+
+  @result.setter
+  def result(self, value):
+    with self.result_lock:
+      self._result = value
+
+  @property
+  def spilled(self):
+    return self._result is None and self.spill_path is not None
+
+  def spill(self, path):
+    """Writes the result to path (once, results do not change) and drops it from memory."""
+    with self.result_lock:
+      if self.spill_path is None:
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as file:
+          pickle.dump(self._result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        self.spill_path = path
+      self._result = None
+
+  @staticmethod
+  def estimate_bytes(value):
+    # Memory held by a result: DataFrames and arrays in tuples, lists, dicts or object attributes
+    if isinstance(value, pd.DataFrame):
+      return int(value.index.memory_usage(deep=True)) + sum(PipelineJob.estimate_bytes(value[column]) for column in value.columns)
+    if isinstance(value, pd.Series) and value.dtype == object:
+      # Rows repeat the same string objects, so count each distinct object once
+      values = value.to_numpy()
+      return values.nbytes + sum(sys.getsizeof(item) for item in {id(item): item for item in values}.values())
+    if isinstance(value, pd.Series):
+      return int(value.memory_usage(index=False, deep=True))
+    if isinstance(value, np.ndarray):
+      return value.nbytes
+    if isinstance(value, (tuple, list)):
+      return sys.getsizeof(value) + sum(PipelineJob.estimate_bytes(item) for item in value)
+    if isinstance(value, dict):
+      return sys.getsizeof(value) + sum(PipelineJob.estimate_bytes(item) for item in value.values())
+    if hasattr(value, '__dict__'):
+      return sum(PipelineJob.estimate_bytes(item) for item in vars(value).values())
+    return sys.getsizeof(value)
+
+  @property
+  def progress(self):
+    """Fraction of the stages completed, between 0 and 1."""
+    return min(self.completed_stages / self.stage_count, 1.0) if self.stage_count else 0.0
+
+  @property
+  def finished(self):
+    return self.status in ('done', 'failed', 'cancelled')
+
+  def cancel(self):
+    """Requests cancellation; the running stage completes first."""
+    self.cancel_requested.set()
+
+  def run_stage(self, stage, function, *args, **kwargs):
+    """
+    Runs one stage of the pipeline through the job's profiler, stopping first if the job was cancelled.
+
+    Returns:
+        The function's result.
+    """
+
+    if self.cancel_requested.is_set():
+      raise PipelineJob.Cancelled(stage)
+
+    self.current_stage = stage
+    result = self.profiler.run(stage, function, *args, **kwargs)
+    self.completed_stages += 1
+
+    return result
+
+
+class PipelineJobRunner:
+  """
+  Runs pipeline jobs in a background thread pool and keeps the finished ones, so the
+  callers (e.g. Streamlit reruns and sessions) poll a job instead of blocking on it,
+  and submitting the same inputs again returns the existing job.
+
+  With a memory budget, the results of the least recently submitted jobs beyond it are
+  spilled to disk and read back when they are used again, so memory grows with the
+  datasets in use rather than with the datasets kept.
+
+  Args:
+      workers (int): Jobs running at the same time.
+      max_finished_jobs (int): Finished jobs kept; the least recently submitted are dropped first.
+      ttl_seconds (float, optional): Finished jobs older than this are dropped.
+      memory_budget_bytes (int, optional): Bytes of finished results kept in memory; the most recently
+                                           submitted result stays in memory even if it is larger.
+      spill_dir (str, optional): Directory for spilled results, a temporary directory if omitted.
+  """
+
+  def __init__(self, workers=2, max_finished_jobs=4, ttl_seconds=None, memory_budget_bytes=None, spill_dir=None):
+    self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pipeline-job')
+    self.max_finished_jobs = max_finished_jobs
+    self.ttl_seconds = ttl_seconds
+    self.memory_budget_bytes = memory_budget_bytes
+    self.spill_dir = spill_dir
+    self.jobs = OrderedDict()
+    self.lock = threading.Lock()
+
+  def submit(self, key, function, stage_count, *args, track_memory=False, **kwargs):
+    """
+    Submits function(job, *args, **kwargs) unless a job with the same key is queued, running or kept.
+
+    Args:
+        key (hashable): Identifies the inputs of the run.
+        function (callable): The pipeline; it receives the PipelineJob first and runs its stages with job.run_stage.
+        stage_count (int): Number of stages the pipeline runs.
+        track_memory (bool): Measure each stage's peak memory.
+
+    Returns:
+        PipelineJob: The new or existing job.
+    """
+
+    with self.lock:
+      self.evict_finished_jobs()
+
+      job = self.jobs.get(key)
+      if job is None:
+        job = PipelineJob(key, stage_count, PipelineProfiler(track_memory=track_memory))
+        self.jobs[key] = job
+        self.executor.submit(PipelineJobRunner.execute, job, function, args, kwargs)
+      self.jobs.move_to_end(key)
+
+      self.spill_finished_jobs()
+
+      return job
+
+  @staticmethod
+  def execute(job, function, args, kwargs):
+    job.status = 'running'
+    try:
+      job.result = function(job, *args, **kwargs)
+      job.result_bytes = PipelineJob.estimate_bytes(job.result)
+      job.status = 'done'
+    except PipelineJob.Cancelled:
+      job.status = 'cancelled'
+    except Exception as error:
+      job.error = error
+      job.status = 'failed'
+    finally:
+      job.current_stage = None
+      job.finished_at = time.time()
+
+  def discard(self, key):
+    """Forgets a job, so the next submit with its key starts a new run."""
+    with self.lock:
+      self.drop_job(key)
+
+  def drop_job(self, key):
+    job = self.jobs.pop(key, None)
+    if job is not None and job.spill_path is not None and os.path.exists(job.spill_path):
+      os.remove(job.spill_path)
+
+  def evict_finished_jobs(self):
+    finished_keys = [key for key, job in self.jobs.items() if job.finished]
+
+    if self.ttl_seconds is not None:
+      expired_keys = [key for key in finished_keys if time.time() - self.jobs[key].finished_at > self.ttl_seconds]
+      for key in expired_keys:
+        self.drop_job(key)
+      finished_keys = [key for key in finished_keys if key not in expired_keys]
+
+    for key in finished_keys[:max(len(finished_keys) - self.max_finished_jobs, 0)]:
+      self.drop_job(key)
+
+  def spill_finished_jobs(self):
+    if self.memory_budget_bytes is None:
+      return
+
+    # Least recently submitted first; the most recent result is never spilled
+    in_memory_jobs = [job for job in self.jobs.values() if job.status == 'done' and not job.spilled]
+    memory_bytes = sum(job.result_bytes for job in in_memory_jobs)
+
+    for job in in_memory_jobs[:-1]:
+      if memory_bytes <= self.memory_budget_bytes:
+        break
+      if self.spill_dir is None:
+        self.spill_dir = tempfile.mkdtemp(prefix='pipeline-results-')
+      os.makedirs(self.spill_dir, exist_ok=True)
+      job.spill(os.path.join(self.spill_dir, hashlib.sha256(repr(job.key).encode()).hexdigest() + '.pkl'))
+      memory_bytes -= job.result_bytes
+
+
+class FilterIndex:
+  """
+  Inverted index of row positions per value of each filter dimension, built once per dataset.
+
+  Filters become unions of the selected values' positions within a dimension and
+  intersections across dimensions, instead of a chain of isin masks and frame copies.
+
+  Args:
+      dimensions (dict): Dimension name -> values (pd.Series or array), one per row.
+  """
+
+  def __init__(self, dimensions):
+    self.options = {}
+    self.positions = {}
+    self.row_count = None
+
+    for dimension, values in dimensions.items():
+      codes, uniques = pd.factorize(pd.Series(values), sort=False)
+      self.row_count = len(codes)
+
+      # Group the row positions by value code; missing values (code -1) are not indexed
+      row_order = np.argsort(codes, kind='stable')
+      row_order = row_order[codes[row_order] >= 0]
+      value_counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+      self.options[dimension] = list(uniques)
+      self.positions[dimension] = dict(zip(self.options[dimension], np.split(row_order, np.cumsum(value_counts)[:-1])))
+
+  def filter(self, selections):
+    """
+    Finds the rows matching every non-empty selection.
+
+    Args:
+        selections (dict): Dimension name -> selected values; an empty selection does not filter.
+
+    Returns:
+        numpy.ndarray: The sorted positions of the matching rows.
+    """
+
+    mask = None
+    for dimension, selected_values in selections.items():
+      if not selected_values:
+        continue
+
+      dimension_mask = np.zeros(self.row_count, dtype=bool)
+      for value in selected_values:
+        dimension_mask[self.positions[dimension].get(value, [])] = True
+      mask = dimension_mask if mask is None else mask & dimension_mask
+
+    return np.arange(self.row_count) if mask is None else np.flatnonzero(mask)
+
+
+class TableUtils:
+
+  # Rows per page offered for the paginated data table
+  PAGE_SIZES = [50, 100, 500, 1000]
+
+  @staticmethod
+  def search_positions(data_frame, text):
+    """
+    Finds the rows where any column contains a text, ignoring case.
+
+    Every column is searched through its distinct values, which are far fewer than its rows.
+
+    Args:
+        data_frame (pd.DataFrame): The table.
+        text (str): Text to search for; an empty text matches every row.
+
+    Returns:
+        numpy.ndarray: The sorted positions of the matching rows.
+    """
+
+    if not text:
+      return np.arange(len(data_frame))
+
+    mask = np.zeros(len(data_frame), dtype=bool)
+    for column in data_frame.columns:
+      codes, uniques = pd.factorize(data_frame[column])
+      value_hits = np.asarray(pd.Index(uniques).astype(str).str.contains(text, case=False, regex=False), dtype=bool)
+      mask |= (codes >= 0) & value_hits[codes]
+
+    return np.flatnonzero(mask)
+
+  @staticmethod
+  def sort_positions(data_frame, positions, column, ascending=True):
+    """
+    Orders row positions by one column, keeping the current order of ties and putting missing values last.
+
+    Args:
+        data_frame (pd.DataFrame): The table.
+        positions (numpy.ndarray): Row positions, e.g. from search_positions.
+        column (str): Column to sort by.
+        ascending (bool): Sort direction.
+
+    Returns:
+        numpy.ndarray: The positions in sorted order.
+    """
+
+    values = data_frame[column].iloc[positions].reset_index(drop=True)
+    # Object columns can mix types (e.g. numbers and text), so their values are compared as text
+    if values.dtype == object:
+      values = values.where(values.isna(), values.astype(str))
+    order = values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+    return positions[order]
+
+  @staticmethod
+  def page_count(row_count, page_size):
+    """Counts the pages needed for row_count rows, at least one."""
+    return max(1, -(-row_count // page_size))
+
+  @staticmethod
+  def page(data_frame, positions, page_number, page_size):
+    """
+    Takes one page of rows, so only the rows shown are copied and serialized.
+
+    Args:
+        data_frame (pd.DataFrame): The table.
+        positions (numpy.ndarray): Row positions in display order.
+        page_number (int): 1-based page number, clamped to the available pages.
+        page_size (int): Rows per page.
+
+    Returns:
+        tuple: The page DataFrame, the first row number shown (1-based) and the page count.
+    """
+
+    page_count = TableUtils.page_count(len(positions), page_size)
+    start = (min(max(page_number, 1), page_count) - 1) * page_size
+
+    return data_frame.iloc[positions[start:start + page_size]], start + 1, page_count
+
+
+class QueryEngine:
+  """
+  Embedded SQL layer over the processed attendance data, backed by DuckDB (an optional dependency).
+
+  DataFrames are registered as zero-copy views and the stores as views over their Parquet files,
+  so group-bys run vectorized in DuckDB and history larger than memory is streamed from disk.
+
+  Args:
+      external_access (bool): Allow queries to read files; disable it when the SQL comes from users
+                              and only registered DataFrames should be reachable.
+      memory_limit (str, optional): DuckDB memory limit, e.g. '2GB'; larger queries spill to temp_directory.
+      temp_directory (str, optional): Directory for spilled intermediate results.
+  """
+
+  def __init__(self, external_access=True, memory_limit=None, temp_directory=None):
+    import duckdb
+
+    config = {'enable_external_access': external_access}
+    if memory_limit:
+      config['memory_limit'] = memory_limit
+    if temp_directory:
+      config['temp_directory'] = temp_directory
+
+    self.duckdb = duckdb
+    self.connection = duckdb.connect(':memory:', config=config)
+    self.tables = []
+    # One DuckDB connection must not run statements from several threads at once
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def is_available():
+    """Checks whether the duckdb package is installed."""
+    return importlib.util.find_spec('duckdb') is not None
+
+  @staticmethod
+  def quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+  def add_table(self, name):
+    if name not in self.tables:
+      self.tables.append(name)
+
+  def register_frame(self, name, data_frame):
+    """
+    Registers a DataFrame as a view without copying it.
+
+    Args:
+        name (str): View name, e.g. 'attendance'.
+        data_frame (pd.DataFrame): The data, e.g. the output of CleaningUtils.transform_attendance_data.
+    """
+
+    with self.lock:
+      self.connection.register(name, data_frame)
+    self.add_table(name)
+
+  def register_parquet(self, name, path, hive_partitioning=False):
+    """
+    Registers Parquet files as a view; they are scanned when queried, not loaded.
+
+    Args:
+        name (str): View name.
+        path (str): Parquet file or glob.
+        hive_partitioning (bool): Read 'key=value' directories as columns.
+    """
+
+    path = path.replace("'", "''")
+    with self.lock:
+      self.connection.execute(f"CREATE OR REPLACE VIEW {QueryEngine.quote(name)} AS "
+                              f"SELECT * FROM read_parquet('{path}', hive_partitioning={str(hive_partitioning).lower()})")
+    self.add_table(name)
+
+  def register_incremental_store(self, store_dir, name='attendance_history'):
+    """Registers the records of an IncrementalUtils store as a view."""
+    self.register_parquet(name, os.path.join(store_dir, IncrementalUtils.RECORDS_FILE))
+
+  def register_rollup_store(self, store_dir, name='code_flags'):
+    """Registers the records of a RollupUtils store, with their 'Month' partition column, as a view."""
+    self.register_parquet(name, os.path.join(store_dir, f'{RollupUtils.PARTITION_COLUMN}=*', RollupUtils.PARTITION_FILE),
+                          hive_partitioning=True)
+
+  def query(self, sql, max_rows=None):
+    """
+    Runs one read-only SQL query over the registered views.
+
+    Args:
+        sql (str): A single SELECT statement.
+        max_rows (int, optional): Return at most this many rows.
+
+    Returns:
+        pd.DataFrame: The query result.
+
+    Raises:
+        ValueError: If the SQL is not a single SELECT statement or DuckDB rejects it.
+    """
+
+    with self.lock:
+      try:
+        statements = self.connection.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != self.duckdb.StatementType.SELECT:
+          raise ValueError('Only a single SELECT query can be run.')
+
+        result = self.connection.sql(statements[0].query)
+        if max_rows is not None:
+          result = result.limit(max_rows)
+        return result.df()
+      except self.duckdb.Error as error:
+        raise ValueError(str(error)) from error
@@ -0,0 +1,36 @@
+"""
+Shared test setup: imports from the repository root and the benchmarks' synthetic workbooks.
+"""
+
+import os
+import sys
+
+import pytest
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY_DIR)
+sys.path.insert(0, os.path.join(REPOSITORY_DIR, 'benchmarks'))
+
+from functions import CleaningUtils
+from synthetic_data import generate_dataset
+
+
+@pytest.fixture(scope='session')
+def paths(tmp_path_factory):
+    # Large enough for every code, late and overtime punches and blank schedule cells to occur
+    return generate_dataset(str(tmp_path_factory.mktemp('fixtures')), employees=200, days=7, seed=11)
+
+
+@pytest.fixture(scope='session')
+def inputs(paths):
+    """The parsed workbooks: attendance_df, date_list, master_list_df and sched_df. Tests copy before changing them."""
+    attendance_df, date_list = CleaningUtils.generate_attendance_dataframe(paths['attendance'])
+    master_list_df = CleaningUtils.create_master_employee_list(paths['master_list'])
+    sched_df = CleaningUtils.create_schedule_dataframe(paths['schedule'])
+    return attendance_df, date_list, master_list_df, sched_df
+
+
+@pytest.fixture(scope='session')
+def merged_df(inputs):
+    attendance_df, date_list, master_list_df, _ = inputs
+    return CleaningUtils.incorporate_master_data(attendance_df.copy(), master_list_df, date_list)
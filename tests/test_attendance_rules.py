@@ -0,0 +1,156 @@
+"""
+Checks how AttendanceRules resolve, validate and load policies, and that the default rules
+code attendance like the original fixed thresholds.
+"""
+
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import AttendanceRules, CleaningUtils
+
+POLICIES = [{'site': 'Makati', 'late_grace_minutes': 1, 'overtime_threshold_minutes': 30},
+            {'lob': 'RBC', 'late_grace_minutes': 2, 'early_out_grace_minutes': 5},
+            {'lob': 'RBC', 'site': 'Makati', 'late_grace_minutes': 3}]
+
+
+def original_codes(scheduled_in, scheduled_out, actual_in, actual_out):
+    # The fixed thresholds coded before AttendanceRules existed
+    minutes = lambda actual, scheduled: (datetime.strptime(actual, '%H:%M') - datetime.strptime(scheduled, '%I:%M%p')).total_seconds() / 60
+    codes = []
+
+    check_in_difference = minutes(actual_in, scheduled_in)
+    if check_in_difference <= -16:
+        codes.append('(OT)')
+    elif check_in_difference >= 1:
+        codes.append('(L)')
+
+    check_out_difference = minutes(actual_out, scheduled_out)
+    if check_out_difference >= 16:
+        codes.append('(OT)')
+    elif check_out_difference <= -1:
+        codes.append('(L)')
+
+    return list(np.unique(codes))
+
+
+@pytest.mark.parametrize('lob, site, expected', [
+    ('RBC', 'Makati', {'late_grace_minutes': 3, 'early_out_grace_minutes': 5, 'overtime_threshold_minutes': 30}),
+    ('RBC', 'BGC', {'late_grace_minutes': 2, 'early_out_grace_minutes': 5, 'overtime_threshold_minutes': 16}),
+    ('HSQ', 'Makati', {'late_grace_minutes': 1, 'early_out_grace_minutes': 0, 'overtime_threshold_minutes': 30}),
+    ('HSQ', 'BGC', {'late_grace_minutes': 0, 'early_out_grace_minutes': 0, 'overtime_threshold_minutes': 16}),
+])
+def test_lob_and_site_policy_wins_over_lob_over_site(lob, site, expected):
+    # Listed in reverse precedence order, so the order of the config does not decide
+    rules = AttendanceRules(policies=POLICIES[::-1])
+
+    assert rules.resolve_policy(lob, site) == dict(AttendanceRules.DEFAULT_POLICY, **expected)
+
+
+def test_policy_limits_resolve_every_row():
+    rules = AttendanceRules(policies=POLICIES)
+    limits = rules.policy_limits(['RBC', 'HSQ', 'RBC', 'ISA'], ['Makati', 'Makati', 'BGC', 'Ortigas'])
+
+    assert limits['late_grace_minutes'].tolist() == [3, 1, 2, 0]
+    assert limits['overtime_threshold_minutes'].tolist() == [30, 30, 16, 16]
+    # Limits shared by every row stay scalars
+    assert limits['overtime_rounding_minutes'] == 1
+    assert AttendanceRules.take_limits(limits, [2])['late_grace_minutes'].tolist() == [2]
+
+
+@pytest.mark.parametrize('default_policy, policies', [
+    ({'late_grace': 5}, None),
+    ({'late_grace_minutes': -1}, None),
+    ({'late_grace_minutes': 721}, None),
+    ({'overtime_rounding_minutes': 0}, None),
+    ({'late_grace_minutes': 2.5}, None),
+    ({'late_grace_minutes': True}, None),
+    ({'overnight_shifts': 1}, None),
+    (None, [{'late_grace_minutes': 5}]),
+    (None, [{'lob': 'RBC', 'shift': 'night'}]),
+])
+def test_invalid_policies_are_rejected(default_policy, policies):
+    with pytest.raises(ValueError):
+        AttendanceRules(default_policy=default_policy, policies=policies)
+
+
+def test_load_reads_a_json_config(tmp_path):
+    config = {'attendance_codes': ['VL', 'SL', 'OFF', 'HalfDay'],
+              'default_policy': {'overtime_threshold_minutes': 20},
+              'policies': [{'lob': 'RBC', 'site': 'Makati', 'late_grace_minutes': 5, 'overtime_rounding_minutes': 15}]}
+    config_path = tmp_path / 'rules.json'
+    config_path.write_text(json.dumps(config), encoding='utf-8')
+
+    rules = AttendanceRules.load(str(config_path))
+
+    assert rules.attendance_codes == {'VL', 'SL', 'OFF', 'HalfDay'}
+    assert rules.resolve_policy('RBC', 'Makati') == dict(AttendanceRules.DEFAULT_POLICY, overtime_threshold_minutes=20,
+                                                         late_grace_minutes=5, overtime_rounding_minutes=15)
+    assert rules.fingerprint == AttendanceRules(**config).fingerprint != AttendanceRules().fingerprint
+
+
+def test_load_rejects_unknown_settings(tmp_path):
+    config_path = tmp_path / 'rules.json'
+    config_path.write_text(json.dumps({'policy': [{'lob': 'RBC', 'late_grace_minutes': 5}]}), encoding='utf-8')
+
+    with pytest.raises(ValueError, match='policy'):
+        AttendanceRules.load(str(config_path))
+
+
+def test_default_rules_match_the_original_thresholds():
+    # Every check-in and check-out from an hour early to an hour late around a day shift
+    times = [f'{hour:02d}:{minute:02d}' for hour in (8, 9) for minute in range(60)]
+    for actual_in in times:
+        for actual_out in ['16:59', '17:00', '17:14', '17:15', '17:16', '18:00']:
+            expected = original_codes('09:00AM', '05:00PM', actual_in, actual_out)
+            assert CleaningUtils.analyze_attendance_time_differences('09:00AM', '05:00PM', actual_in, actual_out) == expected
+
+
+def test_default_rules_match_no_rules(merged_df, inputs, tmp_path):
+    sched_df = inputs[3]
+    config_path = tmp_path / 'rules.json'
+    config_path.write_text(json.dumps({'default_policy': AttendanceRules.DEFAULT_POLICY}), encoding='utf-8')
+
+    _, expected_unparsed_df, expected_df = CleaningUtils.process_attendance_codes(merged_df.copy(), sched_df)
+    for rules in [AttendanceRules(), AttendanceRules.load(str(config_path))]:
+        _, unparsed_df, grouped_df = CleaningUtils.process_attendance_codes(merged_df.copy(), sched_df, rules)
+        pd.testing.assert_frame_equal(grouped_df, expected_df)
+        pd.testing.assert_frame_equal(unparsed_df, expected_unparsed_df)
+
+
+def test_grace_and_rounding():
+    # Scheduled 09:00-18:00 (540-1080); in 09:04, 09:06 and 08:30, out 18:29, 17:55 and 18:40
+    scheduled_in, scheduled_out = np.full(3, 540), np.full(3, 1080)
+    actual_in, actual_out = np.array([544, 546, 510]), np.array([1109, 1075, 1120])
+    limits = dict(AttendanceRules.DEFAULT_POLICY, late_grace_minutes=5, early_out_grace_minutes=5,
+                  overtime_threshold_minutes=30, overtime_rounding_minutes=15)
+
+    is_late, is_overtime = CleaningUtils.flag_late_and_overtime(scheduled_in, scheduled_out, actual_in, actual_out, limits)
+
+    assert is_late.tolist() == [False, True, False]
+    # 29 minutes round down to 15, 30 minutes early in and 40 late out round to 30
+    assert is_overtime.tolist() == [False, False, True]
+
+    # Checking in 40 minutes early is not overtime when early_in_overtime is off
+    limits['early_in_overtime'] = False
+    limits['overtime_rounding_minutes'] = 1
+    _, is_overtime = CleaningUtils.flag_late_and_overtime(np.array([540]), np.array([1080]), np.array([500]), np.array([1080]), limits)
+    assert is_overtime.tolist() == [False]
+
+
+def test_overnight_shift_wraps_around_midnight():
+    # Scheduled 22:00-00:00: in at 00:05 is over two hours late, out at 23:50 ten minutes early
+    arguments = np.array([1320, 1320]), np.array([0, 0]), np.array([5, 1320]), np.array([0, 1430])
+
+    is_late, is_overtime = CleaningUtils.flag_late_and_overtime(*arguments)
+    assert is_late.tolist() == [True, True]
+    assert is_overtime.tolist() == [False, False]
+
+    # Without the wrap the same times read as almost a day early in or late out
+    limits = dict(AttendanceRules.DEFAULT_POLICY, overnight_shifts=False)
+    is_late, is_overtime = CleaningUtils.flag_late_and_overtime(*arguments, limits)
+    assert is_late.tolist() == [False, False]
+    assert is_overtime.tolist() == [True, True]
@@ -0,0 +1,90 @@
+"""
+Compares CleaningUtils.clean_time_data with the original row-wise cleaning it replaced
+(CleaningUtils.clean_time applied per row, then a whitespace pass per date column) on
+synthetic fixture workbooks and on hand-written edge cases.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import CleaningUtils
+
+# None and NaN must not be mixed up, so pandas' mismatched null warning fails the test
+pytestmark = pytest.mark.filterwarnings('error::FutureWarning')
+
+
+def legacy_clean_time(row):
+    # The original CleaningUtils.clean_time, kept as the reference
+    for col in row.index:
+        x = row[col]
+        if isinstance(x, str):
+            x = x.replace("外勤", "").strip()
+            times = x.split('\n')
+            if x.count("\n") > 1 and ":" in x:
+                row[col] = f"{times[0]} - {times[-1]} (MUL)"
+            elif x.count("\n") == 1 and x.count(":") == 2:
+                row[col] = f"{times[0]} - {times[-1]}"
+            elif x.count(":") == 1:
+                row[col] = f"{x} (MIS)"
+            else:
+                row[col] = x
+        else:
+            if pd.isna(x):
+                row[col] = np.nan
+    return row
+
+
+def legacy_clean_time_data(attendance_dataframe):
+    # The original app.py steps: clean_time per row, then remove whitespaces per date column
+    attendance_dataframe.iloc[:, 10:] = attendance_dataframe.iloc[:, 10:].apply(legacy_clean_time, axis=1)
+    for col in attendance_dataframe.columns[10:]:
+        attendance_dataframe[col] = attendance_dataframe[col].str.replace(r'\s+', '', regex=True)
+    return attendance_dataframe
+
+
+EDGE_CELLS = [
+    '外勤09:01\n外勤18:00',       # field-work markers
+    '09:02',                      # single punch (MIS)
+    '外勤09:03',
+    '09:00\n12:00\n18:00',        # multiple punches (MUL)
+    '09:00\n\n18:00',             # blank line between punches
+    '\n09:00\n18:00\n',           # leading and trailing blank lines
+    '09:00\n\n',
+    ' 09:00 \n 18:00 ',
+    '09:00 (VL)',                 # schedule codes added by update_attendance_codes
+    'nan (VL)',
+    '09:00\n18:00 (SL)',
+    '外勤',
+    '',
+    '   ',
+    'OFF',
+    123,                          # non-string cells
+    4.5,
+    None,
+    np.nan,
+]
+
+
+@pytest.fixture(scope='module')
+def coded_df(inputs, merged_df):
+    return CleaningUtils.update_attendance_codes(merged_df.copy(), inputs[3])
+
+
+def assert_same_cleaning(attendance_dataframe):
+    expected = legacy_clean_time_data(attendance_dataframe.copy())
+    actual = CleaningUtils.clean_time_data(attendance_dataframe.copy())
+    pd.testing.assert_frame_equal(actual.astype(object), expected.astype(object))
+
+
+def test_fixture_workbooks(coded_df):
+    assert_same_cleaning(coded_df)
+
+
+def test_edge_cells(coded_df):
+    attendance_dataframe = coded_df.head(len(EDGE_CELLS)).copy().astype({column: object for column in coded_df.columns[10:]})
+    # Every edge case in every date column, shifted by one row per column
+    for offset, column in enumerate(attendance_dataframe.columns[10:]):
+        attendance_dataframe[column] = pd.Series(np.roll(np.array(EDGE_CELLS, dtype=object), offset),
+                                                 index=attendance_dataframe.index, dtype=object)
+    assert_same_cleaning(attendance_dataframe)
@@ -0,0 +1,23 @@
+"""
+Checks that the day fingerprints of the incremental store do not change when the master
+list and schedule are loaded from parsed snapshots instead of the workbooks.
+"""
+
+import pandas as pd
+
+from functions import IncrementalUtils, SnapshotUtils
+
+
+def test_fingerprints_survive_a_snapshot_round_trip(paths, inputs, tmp_path):
+    attendance_df, date_list, master_list_df, sched_df = inputs
+    snapshot_dir = str(tmp_path / 'snapshots')
+    # Blank schedule cells come back from a snapshot as None instead of NaN
+    assert sched_df[date_list].isna().any().any()
+    expected = IncrementalUtils.day_fingerprints(attendance_df, master_list_df, sched_df, date_list)
+
+    # The first load parses the workbooks and writes the snapshots, the second reads them back
+    for _ in range(2):
+        master_list_df = SnapshotUtils.load(paths['master_list'], 'master', snapshot_dir)
+        sched_df = SnapshotUtils.load(paths['schedule'], 'schedule', snapshot_dir)
+        fingerprints = IncrementalUtils.day_fingerprints(attendance_df, master_list_df, sched_df, date_list)
+        pd.testing.assert_series_equal(fingerprints, expected)
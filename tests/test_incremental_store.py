@@ -0,0 +1,47 @@
+"""
+Checks that several attendance extracts can share one incremental store.
+"""
+
+import pandas as pd
+import pytest
+
+from functions import CleaningUtils, IncrementalUtils
+
+pytestmark = pytest.mark.filterwarnings('error::FutureWarning')
+
+
+def serial_records(attendance_df, date_list, master_list_df, sched_df):
+    merged_df = CleaningUtils.incorporate_master_data(attendance_df.copy(), master_list_df, date_list)
+    return CleaningUtils.process_attendance_codes(merged_df, sched_df)[2]
+
+
+def run(attendance_df, inputs, store_dir):
+    _, date_list, master_list_df, sched_df = inputs
+    records, _, changed_dates = IncrementalUtils.process_attendance_incrementally(
+        attendance_df.copy(), date_list, master_list_df, sched_df, store_dir)
+    expected = serial_records(attendance_df, date_list, master_list_df, sched_df)
+    pd.testing.assert_frame_equal(records.astype(object), expected.astype(object))
+    return changed_dates
+
+
+def test_extracts_of_different_teams_keep_their_days(inputs, tmp_path):
+    attendance_df, date_list = inputs[0], inputs[1]
+    team_a, team_b = attendance_df.iloc[:100], attendance_df.iloc[100:]
+
+    assert run(team_a, inputs, str(tmp_path)) == date_list
+    assert run(team_b, inputs, str(tmp_path)) == date_list
+    assert run(team_a, inputs, str(tmp_path)) == []
+    assert run(team_b, inputs, str(tmp_path)) == []
+
+
+def test_overlapping_extract_invalidates_replaced_days(inputs, tmp_path):
+    attendance_df, date_list = inputs[0], inputs[1]
+    # A corrected extract of part of the employees, with new punches on the first day
+    corrected_df = attendance_df.iloc[:50].copy()
+    corrected_df[date_list[0]] = '07:00\n19:00'
+
+    assert run(attendance_df, inputs, str(tmp_path)) == date_list
+    assert run(corrected_df, inputs, str(tmp_path)) == date_list
+    # The corrected extract replaced the full extract's records of its employees, so they are re-coded
+    assert run(attendance_df, inputs, str(tmp_path)) == date_list
+    assert run(attendance_df, inputs, str(tmp_path)) == []
@@ -0,0 +1,23 @@
+"""
+Checks that the Late Count metric, parsed from the Remarks of the long-format records,
+matches the late codes of the attendance matrix.
+"""
+
+import pytest
+
+from functions import AnalysisUtils, AttendanceMatrix, CleaningUtils
+
+
+@pytest.fixture(scope='module')
+def processed(inputs, merged_df):
+    attendance_matrix, _, grouped_df = CleaningUtils.process_attendance_codes(merged_df.copy(), inputs[3])
+    return attendance_matrix, grouped_df
+
+
+def test_late_count_matches_late_coded_cells(processed):
+    attendance_matrix, grouped_df = processed
+    late_cells = ((attendance_matrix.codes & AttendanceMatrix.CODE_BITS['(L)']) != 0).sum()
+
+    assert late_cells > 0
+    assert AnalysisUtils.metric_count(grouped_df)[3] == late_cells
+
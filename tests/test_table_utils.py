@@ -0,0 +1,18 @@
+"""
+Checks the row ordering of the paged Cleaned Data table.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import TableUtils
+
+
+@pytest.mark.parametrize('ascending, expected', [(True, [1, 5, 3, 0, 2, 4]), (False, [0, 3, 5, 1, 2, 4])])
+def test_sort_positions_mixed_object_column(ascending, expected):
+    # Numbers and text sort as text, missing values last in both directions
+    data_frame = pd.DataFrame({'Remarks': ['b', 1, np.nan, 'a', None, 2.5]})
+    positions = TableUtils.sort_positions(data_frame, np.arange(len(data_frame)), 'Remarks', ascending)
+
+    assert positions.tolist() == expected
@@ -0,0 +1,75 @@
+"""
+Checks that the typed AttendanceMatrix path codes attendance exactly like the string stages
+(update_attendance_codes, clean_time_data, merge_final_attendance_codes and
+transform_attendance_data), which remain the fallback for rows outside the typed model.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import AttendanceMatrix, AttendanceRules, CleaningUtils
+
+# Punch cells the typed path codes itself: multiple and missed punches, field work, overnight
+TYPED_CELLS = ['08:55\n12:00\n18:10', '09:00', '外勤09:00\n外勤18:00', '外勤09:07', ' 09:00\n18:00 ',
+               '09:00\n18:00\n19:00\n20:00', np.nan, '23:59\n00:10']
+
+# Punch cells that send their row to the string stages
+UNPARSEABLE_CELLS = ['9:00\n18:00', 'abc', 5, '25:00\n18:00', '', '09:00\n\n18:00']
+
+CUSTOM_RULES = AttendanceRules(
+    attendance_codes=list(CleaningUtils.ATTENDANCE_CODES) + ['HalfDay'],
+    default_policy={'late_grace_minutes': 5},
+    policies=[{'lob': 'RBC', 'overtime_rounding_minutes': 15, 'early_in_overtime': False},
+              {'site': 'Makati', 'overtime_threshold_minutes': 30},
+              {'lob': 'HSQ', 'site': 'BGC', 'overnight_shifts': False, 'early_out_grace_minutes': 10}])
+
+
+def string_path(merged_df, sched_df, rules):
+    # The string stages on every row, as applied to the fallback rows
+    coded_df = CleaningUtils.update_attendance_codes(merged_df.copy(), sched_df, rules)
+    coded_df = CleaningUtils.clean_time_data(coded_df)
+    coded_df, unparsed_df = CleaningUtils.merge_final_attendance_codes(CleaningUtils, coded_df, sched_df, rules)
+    return coded_df, unparsed_df, CleaningUtils.transform_attendance_data(coded_df)
+
+
+@pytest.fixture(scope='module')
+def edge_inputs(inputs):
+    attendance_df, date_list, master_list_df, sched_df = inputs
+    attendance_df = attendance_df.astype({date_column: object for date_column in date_list}).reset_index(drop=True)
+    sched_df = sched_df.copy()
+
+    # Each date column gets the edge cells shifted by one row
+    for offset, date_column in enumerate(date_list):
+        attendance_df.loc[0:39, date_column] = np.resize(np.roll(np.array(TYPED_CELLS, dtype=object), offset), 40)
+        attendance_df.loc[40:49, date_column] = np.resize(np.roll(np.array(UNPARSEABLE_CELLS, dtype=object), offset), 10)
+
+    # A work number missing from the master list and schedule, and a work number listed twice
+    attendance_df.loc[50, 'WB Work Number'] = 'WB999999'
+    attendance_df.loc[51, 'WB Work Number'] = attendance_df.loc[52, 'WB Work Number']
+
+    merged_df = CleaningUtils.incorporate_master_data(attendance_df, master_list_df, date_list)
+
+    # Schedule cells that cannot be parsed, or are codes of the custom rules only
+    for row, schedule_cell in zip([60, 61, 62], ['13:00PM-06:00PM', 'xyz', 'HalfDay']):
+        sched_df.loc[sched_df['Work Number'] == merged_df['WB Work Number'].iloc[row], date_list[0]] = schedule_cell
+
+    return merged_df, sched_df
+
+
+@pytest.mark.parametrize('rules', [None, CUSTOM_RULES], ids=['default rules', 'custom rules'])
+def test_typed_path_matches_string_stages(edge_inputs, rules):
+    merged_df, sched_df = edge_inputs
+    attendance_matrix, unparsed_df, grouped_df = CleaningUtils.process_attendance_codes(merged_df.copy(), sched_df, rules)
+    expected_wide_df, expected_unparsed_df, expected_df = string_path(merged_df, sched_df, rules)
+
+    # Both paths must be exercised, and the typed rows must include the edge codes
+    typed_codes = attendance_matrix.codes[~attendance_matrix.is_fallback]
+    assert attendance_matrix.is_fallback.any() and not attendance_matrix.is_fallback.all()
+    for code in ['(MIS)', '(MUL)', '(L)', '(OT)']:
+        assert (typed_codes & AttendanceMatrix.CODE_BITS[code]).any(), code
+
+    pd.testing.assert_frame_equal(grouped_df, expected_df)
+    pd.testing.assert_frame_equal(attendance_matrix.to_wide_frame(), expected_wide_df)
+    pd.testing.assert_frame_equal(unparsed_df.reset_index(drop=True), expected_unparsed_df.reset_index(drop=True),
+                                  check_dtype=False, check_index_type=False)